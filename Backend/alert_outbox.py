@@ -0,0 +1,216 @@
+"""
+CityWatch - Durable Alert Outbox
+SQLite-backed priority queue between threat detection and Telegram dispatch.
+Repeated events per camera/type are coalesced, a fixed pool of workers sends
+the most urgent alert first, and queued alerts survive a restart.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+
+
+class AlertOutbox:
+    """
+    Priority outbox for threat alerts.
+    submit() is cheap and called from the video thread; workers claim the
+    highest-priority pending alert (WEAPON > PERSON DOWN > SOS), call
+    send_fn(alert) and mark it sent, or retry with backoff if it returns False.
+    """
+
+    PRIORITIES = {'WEAPON DETECTED': 0, 'PERSON DOWN': 1, 'SOS SIGNAL': 2}
+    DEFAULT_PRIORITY = 9
+    PRUNE_INTERVAL = 3600.0  # Seconds between retention sweeps
+
+    def __init__(self, path: str, send_fn: Callable[[Dict[str, Any]], bool], workers: int = 2,
+                 coalesce_window: float = 30.0, max_attempts: int = 5, retry_backoff: float = 5.0,
+                 retention_days: Optional[float] = 7.0):
+        self.path = path
+        self.send_fn = send_fn
+        self.workers = workers
+        self.coalesce_window = coalesce_window
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retention_days = retention_days  # Sent/failed alerts older than this are deleted (None/0 = keep)
+        self._last_prune = 0.0
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                camera_id TEXT NOT NULL,
+                alert_type TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                captured_at REAL NOT NULL,
+                zone TEXT,
+                photo BLOB,
+                count INTEGER NOT NULL DEFAULT 1,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                sent_at REAL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_alerts_queue ON alerts (status, priority, created_at)")
+        self._cond = threading.Condition()
+        self._threads = []
+        self.running = False
+
+        # (camera, type) -> (alert id, created_at) of the alert that absorbs repeats
+        self._recent: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        self._pending_counts: Dict[int, int] = {}  # Coalesced repeats not yet written
+
+        # Counters for /pipeline_stats
+        self.submitted = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+        self.pruned = 0
+
+        self._recover()
+
+    def _recover(self):
+        """Requeue alerts interrupted mid-send and rebuild the coalescing window."""
+        with self._cond:
+            requeued = self._db.execute("UPDATE alerts SET status = 'pending' WHERE status = 'sending'").rowcount
+            rows = self._db.execute(
+                "SELECT id, camera_id, alert_type, created_at FROM alerts WHERE created_at >= ?",
+                (time.time() - self.coalesce_window,)).fetchall()
+            for alert_id, camera_id, alert_type, created_at in rows:
+                self._recent[(camera_id, alert_type)] = (alert_id, created_at)
+            pending = self._db.execute("SELECT COUNT(*) FROM alerts WHERE status = 'pending'").fetchone()[0]
+        if pending:
+            print(f"[OUTBOX] {pending} queued alert(s) recovered ({requeued} interrupted)")
+
+    def submit(self, camera_id: Hashable, alert_type: str,
+               photo: Union[bytes, Callable[[], bytes]], zone: Optional[str] = None,
+               captured_at: Optional[float] = None) -> Optional[int]:
+        """
+        Queue an alert. Returns the new alert id, or None if it was coalesced
+        into an alert for the same camera/type within the window.
+        `photo` may be a callable; it is only rendered for a new alert.
+        """
+        now = time.time()
+        key = (str(camera_id), alert_type)
+        with self._cond:
+            self.submitted += 1
+            recent = self._recent.get(key)
+            if recent and now - recent[1] < self.coalesce_window:
+                self._pending_counts[recent[0]] = self._pending_counts.get(recent[0], 0) + 1
+                self.coalesced += 1
+                return None
+
+        jpeg = photo() if callable(photo) else photo
+        with self._cond:
+            alert_id = self._db.execute(
+                "INSERT INTO alerts (camera_id, alert_type, priority, created_at, captured_at, zone, photo) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key[0], alert_type, self.PRIORITIES.get(alert_type, self.DEFAULT_PRIORITY),
+                 now, captured_at or now, zone, jpeg)).lastrowid
+            # Keys outside the window can't absorb repeats any more
+            self._recent = {k: v for k, v in self._recent.items() if now - v[1] < self.coalesce_window}
+            self._recent[key] = (alert_id, now)
+            self._cond.notify()
+        return alert_id
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Take the most urgent due alert and mark it as sending. Call with the lock held."""
+        self._flush_counts()
+        row = self._db.execute(
+            "SELECT id, camera_id, alert_type, created_at, captured_at, zone, photo, count, attempts "
+            "FROM alerts WHERE status = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY priority, created_at LIMIT 1", (time.time(),)).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE alerts SET status = 'sending' WHERE id = ?", (row[0],))
+        keys = ('id', 'camera_id', 'alert_type', 'created_at', 'captured_at', 'zone', 'photo', 'count', 'attempts')
+        return dict(zip(keys, row))
+
+    def _flush_counts(self):
+        """Write coalesced repeat counts (kept in memory so the video thread never writes)."""
+        if self._pending_counts:
+            counts, self._pending_counts = self._pending_counts, {}
+            self._db.executemany("UPDATE alerts SET count = count + ? WHERE id = ?",
+                                 [(n, alert_id) for alert_id, n in counts.items()])
+
+    def _prune(self):
+        """Drop delivered and failed alerts older than the retention period. Call with the lock held."""
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        self.pruned += self._db.execute("DELETE FROM alerts WHERE status IN ('sent', 'failed') AND created_at < ?",
+                                        (cutoff,)).rowcount
+
+    def _next_due_in(self) -> float:
+        row = self._db.execute("SELECT MIN(next_attempt_at) FROM alerts WHERE status = 'pending'").fetchone()
+        return max(0.05, row[0] - time.time()) if row and row[0] is not None else 1.0
+
+    def _worker(self):
+        while self.running:
+            with self._cond:
+                alert = self._claim()
+                if alert is None:
+                    if time.time() - self._last_prune > self.PRUNE_INTERVAL:
+                        self._last_prune = time.time()
+                        self._prune()
+                    self._cond.wait(min(self._next_due_in(), 1.0))
+                    continue
+
+            try:
+                delivered = bool(self.send_fn(alert))
+            except Exception as e:
+                print(f"[OUTBOX] Alert {alert['id']} failed: {e}")
+                delivered = False
+
+            with self._cond:
+                if delivered:
+                    # Photo is no longer needed once delivered
+                    self._db.execute("UPDATE alerts SET status = 'sent', sent_at = ?, photo = NULL WHERE id = ?",
+                                     (time.time(), alert['id']))
+                    self.sent += 1
+                elif alert['attempts'] + 1 >= self.max_attempts:
+                    self._db.execute("UPDATE alerts SET status = 'failed', attempts = attempts + 1 WHERE id = ?",
+                                     (alert['id'],))
+                    self.failed += 1
+                else:
+                    delay = self.retry_backoff * (2 ** alert['attempts'])
+                    self._db.execute("UPDATE alerts SET status = 'pending', attempts = attempts + 1, "
+                                     "next_attempt_at = ? WHERE id = ?", (time.time() + delay, alert['id']))
+
+    def start(self):
+        """Start the dispatch workers."""
+        if self.running:
+            return
+        self.running = True
+        self._threads = [threading.Thread(target=self._worker, name=f"alert-outbox-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Stop the workers; anything still pending stays queued on disk."""
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._cond:
+            self._flush_counts()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth by status and lifetime counters."""
+        with self._cond:
+            by_status = dict(self._db.execute("SELECT status, COUNT(*) FROM alerts GROUP BY status").fetchall())
+        return {
+            'queued': by_status.get('pending', 0) + by_status.get('sending', 0),
+            'by_status': by_status,
+            'workers': self.workers,
+            'submitted': self.submitted,
+            'coalesced': self.coalesced,
+            'sent': self.sent,
+            'failed': self.failed,
+            'pruned': self.pruned
+        }
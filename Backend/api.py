@@ -1,22 +1,90 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
 import cv2
 import numpy as np
 import threading
 import time
-import requests
 import json
-import io
 import uvicorn
-from collections import deque
+import os
 from datetime import datetime
 from logic_core import CityWatchEngine
+from pipeline import VideoPipeline, FrameBroadcaster
+from stats_stream import StatsHub
+from telemetry import Telemetry
+from telegram_client import TelegramClient
+from alert_outbox import AlertOutbox
+from event_store import EventStore
+from clip_recorder import ClipRecorder
+from camera_manager import CameraManager, load_sources
 
 # === CONFIGURATION ===
-BOT_TOKEN = "YOUR_BOT_TOKEN"
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{BOT_TOKEN}"
+BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "YOUR_BOT_TOKEN")
+# Point at a local mock Bot API server for testing, e.g. http://127.0.0.1:8081
+TELEGRAM_API_BASE = os.environ.get("CITYWATCH_TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+TELEGRAM_API_URL = f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}"
+
+# Concurrent chats during alert fan-out (one shared keep-alive session)
+TELEGRAM_WORKERS = int(os.environ.get("CITYWATCH_TELEGRAM_WORKERS", "16"))
+
+# Durable alert outbox: queued alerts survive restarts; repeats per camera/type are coalesced
+ALERT_DB_PATH = os.environ.get("CITYWATCH_ALERT_DB",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "alerts.db"))
+ALERT_WORKERS = int(os.environ.get("CITYWATCH_ALERT_WORKERS", "2"))
+ALERT_COALESCE_SECONDS = float(os.environ.get("CITYWATCH_ALERT_COALESCE_SECONDS", "30"))
+ALERT_RETENTION_DAYS = float(os.environ.get("CITYWATCH_ALERT_RETENTION_DAYS", "7"))  # Sent/failed rows (0 = keep)
+
+# Long-lived threat event history (SQLite WAL), pruned after N days (0 = keep forever)
+EVENT_DB_PATH = os.environ.get("CITYWATCH_EVENT_DB",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "events.db"))
+EVENT_RETENTION_DAYS = float(os.environ.get("CITYWATCH_EVENT_RETENTION_DAYS", "30"))
+
+# Event clips: JPEG pre-roll ring per camera, written to MP4 with post-roll when an alert fires
+CLIP_DIR = os.environ.get("CITYWATCH_CLIP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "clips"))
+CLIP_PRE_ROLL = float(os.environ.get("CITYWATCH_CLIP_PRE_ROLL", "5"))
+CLIP_POST_ROLL = float(os.environ.get("CITYWATCH_CLIP_POST_ROLL", "5"))
+CLIP_FPS = float(os.environ.get("CITYWATCH_CLIP_FPS", "10"))
+
+# Camera sources processed together in batched inference passes.
+# Comma-separated device indices, stream URLs or video files, e.g. CITYWATCH_CAMERAS="0,rtsp://cam2/stream"
+CAMERA_LIST = os.environ.get("CITYWATCH_CAMERAS", "0")
+# Or a JSON file mapping each source to a zone: [{"source": ..., "zone": "NORTH SECTOR", "name": ...}, ...]
+CAMERA_CONFIG_PATH = os.environ.get("CITYWATCH_CAMERA_CONFIG", "")
+# Most cameras per inference batch; the longest-waiting cameras go first (0 = all ready cameras)
+MAX_BATCH = int(os.environ.get("CITYWATCH_MAX_BATCH", "8"))
+
+# Run YOLO every Nth frame while a camera sees nobody (1 = every frame)
+IDLE_DETECT_INTERVAL = int(os.environ.get("CITYWATCH_IDLE_DETECT_INTERVAL", "3"))
+
+# Skip YOLO while nothing moves; optionally run it only on the moved region
+MOTION_GATE = os.environ.get("CITYWATCH_MOTION_GATE", "1") == "1"
+MOTION_CROP = os.environ.get("CITYWATCH_MOTION_CROP", "0") == "1"
+
+# Detector runtime: auto (PyTorch on GPU, else ONNX Runtime / OpenVINO on CPU), torch, onnx, openvino
+DETECTOR_BACKEND = os.environ.get("CITYWATCH_DETECTOR", "auto")
+DETECTOR_THREADS = int(os.environ.get("CITYWATCH_DETECTOR_THREADS", "0")) or None  # 0 = all cores
+DETECTOR_PRECISION = os.environ.get("CITYWATCH_PRECISION", "fp32")  # fp32 | fp16 | int8
+# Detector weights: COCO yolov8n.pt or a pruned head trained on CityWatch's classes only
+DETECTOR_WEIGHTS = os.environ.get("CITYWATCH_MODEL", "yolov8n.pt")
+
+# Per-zone detection options (JSON file keyed by zone name): imgsz, tiles, tile_overlap, roi
+ZONE_CONFIG_PATH = os.environ.get("CITYWATCH_ZONE_CONFIG", "")
+
+def load_zone_config(path):
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[CityWatch] Ignoring zone config {path}: {e}")
+        return {}
+
+ZONE_CONFIG = load_zone_config(ZONE_CONFIG_PATH)
 
 # Mock Zone Data
 ZONES = [
@@ -30,7 +98,6 @@ ZONES = [
 class SystemState:
     def __init__(self):
         self.engine = None
-        self.output_frame = None
         self.lock = threading.Lock()
         self.running = False
         self.grid_mode = False
@@ -39,20 +106,33 @@ class SystemState:
         
         # Bot State
         self.bot_users = {}  # {chat_id: {"muted": False, "joined": timestamp}}
-        self.threat_history = deque(maxlen=10)
         self.command_stats = {}
-        self.frame_buffer = deque(maxlen=15)  # For GIF generation
+        
+        # Staged video pipeline (capture -> inference -> encode)
+        self.telemetry = Telemetry()  # Stage histograms, fps and counters for /metrics
+        self.pipeline = VideoPipeline()
+        self.broadcaster = FrameBroadcaster(telemetry=self.telemetry)  # Encode-once JPEG for all viewers
 
 state = SystemState()
 
+# One capture thread per source, reconnecting with backoff; frames go to the per-camera slots
+cameras = CameraManager(load_sources(CAMERA_CONFIG_PATH, CAMERA_LIST, [z["name"] for z in ZONES]),
+                        deliver=lambda cam_id, ts, frame: state.pipeline.capture_queue(cam_id).put((ts, frame)),
+                        enabled=lambda: state.camera_enabled, telemetry=state.telemetry)
+
 # File-based lock for cross-process synchronization
-import os
 BOT_LOCK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot_polling.lock")
 
 class TelegramSuperBot:
+    UPLOAD_ATTEMPTS = 3  # Chats tried for the one real upload before falling back to bytes
+    
     def __init__(self):
         self.offset = 0
         self._lock_file = None
+        self.client = TelegramClient(TELEGRAM_API_URL, workers=TELEGRAM_WORKERS)
+        
+        # Latest uploaded media, reused while its source is unchanged: kind -> (source key, file_id)
+        self._file_ids = {}
         
         # Clear all pending updates on startup
         self._clear_pending_updates()
@@ -60,9 +140,9 @@ class TelegramSuperBot:
     def _clear_pending_updates(self):
         """Clear any pending updates to start fresh."""
         try:
-            url = f"{TELEGRAM_API_URL}/getUpdates?offset=-1&limit=1&timeout=1"
-            response = requests.get(url, timeout=5)
-            data = response.json()
+            data = self.client.call("getUpdates", {"offset": -1, "limit": 1, "timeout": 1}, timeout=5, retries=0)
+            if data is None:
+                raise ConnectionError("Bot API unreachable")
             if data.get("result"):
                 self.offset = data["result"][-1]["update_id"] + 1
                 print(f"[BOT] Cleared pending updates, starting from offset {self.offset}")
@@ -109,14 +189,8 @@ class TelegramSuperBot:
             pass
         
     def api_call(self, method, **kwargs):
-        """Generic Telegram API caller."""
-        url = f"{TELEGRAM_API_URL}/{method}"
-        try:
-            response = requests.post(url, json=kwargs, timeout=10)
-            return response.json()
-        except Exception as e:
-            print(f"[BOT API ERROR] {method}: {e}")
-            return None
+        """Generic Telegram API caller (pooled session, rate limited, retried)."""
+        return self.client.call(method, kwargs)
 
     def send_message(self, chat_id, text, reply_markup=None, parse_mode="Markdown"):
         payload = {"chat_id": chat_id, "text": text, "parse_mode": parse_mode}
@@ -124,25 +198,113 @@ class TelegramSuperBot:
             payload["reply_markup"] = reply_markup
         return self.api_call("sendMessage", **payload)
 
-    def send_photo(self, chat_id, photo_bytes, caption="", reply_markup=None):
-        url = f"{TELEGRAM_API_URL}/sendPhoto"
-        files = {'photo': ('snapshot.jpg', photo_bytes, 'image/jpeg')}
+    def send_photo(self, chat_id, photo, caption="", reply_markup=None):
+        """Send JPEG bytes (uploaded) or a file_id string from an earlier upload."""
         data = {'chat_id': chat_id, 'caption': caption, 'parse_mode': 'Markdown'}
         if reply_markup:
-            data['reply_markup'] = json.dumps(reply_markup)
-        try:
-            requests.post(url, files=files, data=data, timeout=10)
-        except Exception as e:
-            print(f"[BOT ERROR] Photo failed: {e}")
+            data['reply_markup'] = reply_markup
+        if isinstance(photo, str):
+            data['photo'] = photo
+            result = self.client.call("sendPhoto", data)
+        else:
+            files = {'photo': ('snapshot.jpg', photo, 'image/jpeg')}
+            result = self.client.call("sendPhoto", data, files=files)
+        if not (result and result.get("ok")):
+            print(f"[BOT ERROR] Photo failed: {result}")
+        return result
 
-    def send_animation(self, chat_id, gif_bytes, caption=""):
-        url = f"{TELEGRAM_API_URL}/sendAnimation"
-        files = {'animation': ('clip.gif', gif_bytes, 'image/gif')}
+    def send_animation(self, chat_id, animation, caption=""):
+        """Send GIF bytes (uploaded) or a file_id string from an earlier upload."""
         data = {'chat_id': chat_id, 'caption': caption, 'parse_mode': 'Markdown'}
-        try:
-            requests.post(url, files=files, data=data, timeout=15)
-        except Exception as e:
-            print(f"[BOT ERROR] GIF failed: {e}")
+        if isinstance(animation, str):
+            data['animation'] = animation
+            result = self.client.call("sendAnimation", data)
+        else:
+            files = {'animation': ('clip.gif', animation, 'image/gif')}
+            result = self.client.call("sendAnimation", data, files=files, timeout=15)
+        if not (result and result.get("ok")):
+            print(f"[BOT ERROR] GIF failed: {result}")
+        return result
+
+    def send_video(self, chat_id, video, caption=""):
+        """Send MP4 bytes (uploaded) or a file_id string from an earlier upload."""
+        data = {'chat_id': chat_id, 'caption': caption, 'parse_mode': 'Markdown'}
+        if isinstance(video, str):
+            data['video'] = video
+            result = self.client.call("sendVideo", data)
+        else:
+            files = {'video': ('clip.mp4', video, 'video/mp4')}
+            result = self.client.call("sendVideo", data, files=files, timeout=30)
+        if not (result and result.get("ok")):
+            print(f"[BOT ERROR] Video failed: {result}")
+        return result
+
+    def send_document(self, chat_id, document, caption="", filename="clip.avi"):
+        """Send a file (e.g. MJPEG AVI clip) as bytes or an earlier file_id."""
+        data = {'chat_id': chat_id, 'caption': caption, 'parse_mode': 'Markdown'}
+        if isinstance(document, str):
+            data['document'] = document
+            result = self.client.call("sendDocument", data)
+        else:
+            files = {'document': (filename, document, 'application/octet-stream')}
+            result = self.client.call("sendDocument", data, files=files, timeout=30)
+        if not (result and result.get("ok")):
+            print(f"[BOT ERROR] Document failed: {result}")
+        return result
+
+    @staticmethod
+    def file_id_of(result, kind):
+        """file_id Telegram assigned to a sent photo/animation/video/document, or None."""
+        if not (result and result.get("ok")):
+            return None
+        media = result.get("result", {}).get(kind)
+        if kind == "photo" and media:
+            media = media[-1]  # Largest size
+        return media.get("file_id") if media else None
+
+    def send_cached_media(self, kind, key, chat_id, render, caption=""):
+        """
+        Send a photo/animation/video/document identified by `key` (e.g. frame
+        sequence number). Uploads render() only if this key hasn't been
+        uploaded yet; otherwise reuses the stored file_id.
+        """
+        send = {"photo": self.send_photo, "animation": self.send_animation,
+                "video": self.send_video, "document": self.send_document}[kind]
+        cached = self._file_ids.get(kind)
+        if cached and cached[0] == key:
+            return send(chat_id, cached[1], caption)
+        result = send(chat_id, render(), caption)
+        file_id = self.file_id_of(result, kind)
+        if file_id:
+            self._file_ids[kind] = (key, file_id)
+        return result
+
+    @staticmethod
+    def clip_kind(clip):
+        """MP4 clips play inline as video; the MJPEG AVI fallback goes as a document."""
+        return "video" if clip.path.endswith(".mp4") else "document"
+
+    def send_clip(self, chat_id, clip, caption=""):
+        """Send a recorded clip file, reusing its upload if it was already sent."""
+        def read():
+            with open(clip.path, 'rb') as f:
+                return f.read()
+        return self.send_cached_media(self.clip_kind(clip), clip.key, chat_id, read, caption)
+
+    def broadcast_clip(self, clip, alert_type, zone):
+        """Follow-up to an alert: the pre/post-roll clip for every non-muted chat, uploaded once."""
+        caption = f"🎥 *{alert_type}* - {zone}\n`{clip.end - clip.start:.0f}s` around the event"
+        recipients = [chat_id for chat_id, user_data in list(state.bot_users.items())
+                      if not user_data.get("muted", False)]
+        
+        # Upload to the first chat that accepts it, then fan out the file_id
+        tried = []
+        for chat_id in recipients[:self.UPLOAD_ATTEMPTS]:
+            tried.append(chat_id)
+            if self.file_id_of(self.send_clip(chat_id, clip, caption), self.clip_kind(clip)):
+                break
+        remaining = [chat_id for chat_id in recipients if chat_id not in tried]
+        self.client.fan_out(remaining, lambda chat_id: self.send_clip(chat_id, clip, caption))
 
     def send_location(self, chat_id, lat, lon):
         return self.api_call("sendLocation", chat_id=chat_id, latitude=lat, longitude=lon)
@@ -223,61 +385,49 @@ class TelegramSuperBot:
 
     def cmd_snap(self, chat_id):
         self.track_command("/snap")
-        with state.lock:
-            if state.output_frame is not None:
-                _, img = cv2.imencode('.jpg', state.output_frame)
-                self.send_photo(chat_id, img.tobytes(), "📸 *Live Feed Snapshot*")
-            else:
-                self.send_message(chat_id, "⚠️ Camera Offline")
+        seq, jpeg = state.broadcaster.latest_jpeg()
+        if jpeg is not None:
+            self.send_cached_media("photo", seq, chat_id, lambda: jpeg, "📸 *Live Feed Snapshot*")
+        else:
+            self.send_message(chat_id, "⚠️ Camera Offline")
 
     def cmd_clip(self, chat_id):
         self.track_command("/clip")
-        self.send_message(chat_id, "🎬 Generating 3-second clip...")
-        
-        # Collect frames
-        frames = []
-        with state.lock:
-            frames = list(state.frame_buffer)
         
-        if len(frames) < 5:
+        # Pre-roll of the primary camera, written by the recorder's background writer
+        caption = f"🎬 *Live Clip ({CLIP_PRE_ROLL:.0f}s)*"
+        # Sent from the Telegram client's background pool, not the clip writer thread
+        if recorder.trigger(0, "clip", post_roll=0,
+                            on_done=lambda clip: self.client.submit(self.send_clip, chat_id, clip, caption)):
+            self.send_message(chat_id, "🎬 Preparing clip...")
+        else:
             self.send_message(chat_id, "⚠️ Not enough frames buffered")
-            return
-            
-        # Create GIF
-        try:
-            import imageio
-            gif_buffer = io.BytesIO()
-            with imageio.get_writer(gif_buffer, format='GIF', mode='I', duration=0.1) as writer:
-                for frame in frames[::2]:  # Every other frame
-                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    small = cv2.resize(rgb, (320, 240))
-                    writer.append_data(small)
-            gif_buffer.seek(0)
-            self.send_animation(chat_id, gif_buffer.read(), "🎬 *Live Clip (3s)*")
-        except ImportError:
-            self.send_message(chat_id, "⚠️ GIF library not installed. Use `/snap` instead.")
-        except Exception as e:
-            self.send_message(chat_id, f"⚠️ Clip failed: {e}")
 
     def cmd_zones(self, chat_id):
         self.track_command("/zones")
         msg = "🗺️ *MONITORED ZONES*\n━━━━━━━━━━━━━━━━━━━━\n"
+        camera_stats = cameras.stats()
         for z in ZONES:
             msg += f"\n*{z['name']}*\n"
             msg += f"   Status: {z['status']}\n"
             msg += f"   📍 `{z['lat']}, {z['lon']}`\n"
+            for c in camera_stats:
+                if c['zone'] == z['name']:
+                    icon = "🟢" if c['status'] == 'live' else "🔴"
+                    msg += f"   {icon} {c['name']}: {c['status']} ({c['fps']} fps)\n"
         self.send_message(chat_id, msg)
 
     def cmd_history(self, chat_id):
         self.track_command("/history")
-        if not state.threat_history:
+        recent = event_store.query(limit=5)['events']
+        if not recent:
             self.send_message(chat_id, "📜 No threat events recorded yet.")
             return
             
         msg = "📜 *THREAT HISTORY*\n━━━━━━━━━━━━━━━━━━━━\n"
-        for event in list(state.threat_history)[:5]:
+        for event in recent:
             msg += f"\n🔴 *{event['type']}*\n"
-            msg += f"   Time: `{event['time']}`\n"
+            msg += f"   Time: `{datetime.fromtimestamp(event['ts']).strftime('%d %b %H:%M:%S')}`\n"
             msg += f"   Zone: {event['zone']}\n"
         self.send_message(chat_id, msg)
 
@@ -309,10 +459,10 @@ class TelegramSuperBot:
     def cmd_alert(self, chat_id):
         self.track_command("/alert")
         self.send_message(chat_id, "🧪 *Triggering Test Alert...*")
-        with state.lock:
-            if state.output_frame is not None:
-                _, img = cv2.imencode('.jpg', state.output_frame)
-                self.send_photo(chat_id, img.tobytes(), "🚨 *TEST ALERT*\n⚠️ This is a simulated threat for testing.")
+        seq, jpeg = state.broadcaster.latest_jpeg()
+        if jpeg is not None:
+            self.send_cached_media("photo", seq, chat_id, lambda: jpeg,
+                                   "🚨 *TEST ALERT*\n⚠️ This is a simulated threat for testing.")
 
     def cmd_about(self, chat_id):
         self.track_command("/about")
@@ -341,7 +491,7 @@ class TelegramSuperBot:
             "`/start` - Connect & Menu\n"
             "`/status` - System Health\n"
             "`/snap` - Live Photo\n"
-            "`/clip` - Video GIF\n"
+            "`/clip` - Video clip\n"
             "`/zones` - All Sectors\n"
             "`/history` - Threat Log\n"
             "`/location` - GPS Pin\n"
@@ -397,19 +547,24 @@ class TelegramSuperBot:
         else:
             self.send_message(chat_id, "❓ Unknown command. Type `/help` for list.")
 
-    def broadcast_alert(self, alert_type, frame):
-        """Send alert to all non-muted users with photo AND location."""
-        _, img = cv2.imencode('.jpg', frame)
-        photo_bytes = img.tobytes()
+    def broadcast_alert(self, alert_type, photo_bytes, zone="North-East", camera_id=0,
+                        detected_at=None, repeats=1):
+        """
+        Send alert to all non-muted users with photo AND location.
+        Returns False only if nobody could be reached (the outbox retries it).
+        """
+        started = time.perf_counter()
         
         # 1. Prepare Message
-        timestamp = datetime.now().strftime("%I:%M:%S %p")
+        timestamp = datetime.fromtimestamp(detected_at or time.time()).strftime("%I:%M:%S %p")
         msg = (
             f"🚨 *CRITICAL ALERT: {alert_type}*\n"
             f"⏰ Time: {timestamp}\n"
-            f"📍 Sector: North-East (Cam 01)\n"
-            f"_Automated detection triggered. Immediate attention required._"
+            f"📍 Sector: {zone} (Cam {int(camera_id) + 1:02d})\n"
         )
+        if repeats > 1:
+            msg += f"🔁 Detected {repeats} times\n"
+        msg += "_Automated detection triggered. Immediate attention required._"
         
         # 2. Simulated GPS Coordinates (NYC Time Square area for demo)
         lat, lon = 40.7580, -73.9855
@@ -418,17 +573,38 @@ class TelegramSuperBot:
         lat += random.uniform(-0.001, 0.001)
         lon += random.uniform(-0.001, 0.001)
         
-        for chat_id, user_data in state.bot_users.items():
-            if not user_data.get("muted", False):
-                try:
-                    # 3. Send Photo
-                    self.send_photo(chat_id, photo_bytes, msg)
-                    
-                    # 4. Send Location (Briefly waiting to ensure order)
-                    time.sleep(0.5)
-                    self.send_location(chat_id, lat, lon)
-                except Exception as e:
-                    print(f"Failed to send alert to {chat_id}: {e}")
+        recipients = [chat_id for chat_id, user_data in list(state.bot_users.items())
+                      if not user_data.get("muted", False)]
+        
+        # 3. Upload the photo once; every other chat gets the returned file_id
+        photo = photo_bytes
+        uploaded = {}
+        for chat_id in recipients[:self.UPLOAD_ATTEMPTS]:
+            result = self.send_photo(chat_id, photo_bytes, msg)
+            file_id = self.file_id_of(result, "photo")
+            if file_id:
+                uploaded[chat_id] = result
+                photo = file_id
+                break
+        
+        def deliver(chat_id):
+            # Photo first, then 4. Location once the photo call has returned (keeps order)
+            result = uploaded.get(chat_id) or self.send_photo(chat_id, photo, msg)
+            location = self.send_location(chat_id, lat, lon)
+            return bool(result and result.get("ok") and location and location.get("ok"))
+        
+        # Concurrent across chats, sequential within a chat
+        reached = 0
+        for chat_id, delivered in self.client.fan_out(recipients, deliver).items():
+            if delivered is True:
+                reached += 1
+                state.telemetry.inc('alerts_sent', type=alert_type)
+            else:
+                state.telemetry.inc('alert_failures', type=alert_type)
+                print(f"Failed to send alert to {chat_id}: {delivered}")
+        
+        state.telemetry.observe('alert', (time.perf_counter() - started) * 1000)
+        return reached > 0 or not recipients
 
     def poll(self):
         # Acquire file-based lock - prevents multiple processes from polling
@@ -442,9 +618,10 @@ class TelegramSuperBot:
             
             while state.bot_running:
                 try:
-                    url = f"{TELEGRAM_API_URL}/getUpdates?offset={self.offset}&timeout=10"
-                    response = requests.get(url, timeout=15)
-                    data = response.json()
+                    data = self.client.call("getUpdates", {"offset": self.offset, "timeout": 10},
+                                            timeout=15, retries=0)
+                    if data is None:
+                        raise ConnectionError("Bot API unreachable")
                     
                     if "result" in data:
                         for update in data["result"]:
@@ -483,89 +660,169 @@ class TelegramSuperBot:
 
 bot = TelegramSuperBot()
 
+def dispatch_alert(alert):
+    """Outbox send callback: broadcast one queued alert."""
+    camera_id = int(alert['camera_id']) if str(alert['camera_id']).isdigit() else 0
+    return bot.broadcast_alert(alert['alert_type'], alert['photo'], zone=alert['zone'] or "Unknown",
+                               camera_id=camera_id, detected_at=alert['captured_at'],
+                               repeats=alert['count'])
+
+outbox = AlertOutbox(ALERT_DB_PATH, dispatch_alert, workers=ALERT_WORKERS,
+                     coalesce_window=ALERT_COALESCE_SECONDS, retention_days=ALERT_RETENTION_DAYS or None)
+event_store = EventStore(EVENT_DB_PATH, retention_days=EVENT_RETENTION_DAYS or None)
+recorder = ClipRecorder(CLIP_DIR, pre_roll=CLIP_PRE_ROLL, post_roll=CLIP_POST_ROLL, fps=CLIP_FPS)
+
+def encode_jpeg(frame):
+    _, img = cv2.imencode('.jpg', frame)
+    return img.tobytes()
+
 # === ENGINE LIFECYCLE ===
 def get_engine():
     if state.engine is None:
-        state.engine = CityWatchEngine()
+        state.engine = CityWatchEngine(idle_detect_interval=IDLE_DETECT_INTERVAL,
+                                       motion_gate=MOTION_GATE, motion_crop=MOTION_CROP,
+                                       telemetry=state.telemetry, backend=DETECTOR_BACKEND,
+                                       threads=DETECTOR_THREADS, precision=DETECTOR_PRECISION,
+                                       weights=DETECTOR_WEIGHTS)
+        for cam_id in cameras.camera_ids:
+            options = ZONE_CONFIG.get(zone_for_camera(cam_id)["name"])
+            if options:
+                state.engine.configure_camera(cam_id, **options)
     return state.engine
 
-def video_processing_loop():
-    print("🚀 Video Loop Started")
-    cap = cv2.VideoCapture(0)
-    engine = get_engine()
-    last_alert_time = 0
-    
-    # Create placeholder frame for when camera is disabled
+def zone_for_camera(camera_id):
+    """Map a camera onto its monitored zone."""
+    name = cameras.zone(camera_id)
+    for zone in ZONES:
+        if zone["name"] == name:
+            return zone
+    return ZONES[camera_id % len(ZONES)]
+
+def build_grid(frames):
+    """Tile up to 4 camera frames into a 2x2 grid (repeating feeds if fewer)."""
+    h, w = frames[0].shape[:2]
+    tiles = [cv2.resize(frames[i % len(frames)], (w//2, h//2)) for i in range(4)]
+    top = cv2.hconcat(tiles[:2])
+    bottom = cv2.hconcat(tiles[2:])
+    return cv2.vconcat([top, bottom])
+
+def make_placeholder_frame():
+    """Frame shown while the camera is disabled."""
     placeholder = np.zeros((480, 640, 3), dtype=np.uint8)
     cv2.putText(placeholder, "CAMERA DISABLED", (150, 220),
                cv2.FONT_HERSHEY_SIMPLEX, 1.2, (100, 100, 100), 2)
     cv2.putText(placeholder, "Privacy Mode Active", (180, 270),
                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (80, 80, 80), 2)
     cv2.rectangle(placeholder, (100, 180), (540, 300), (60, 60, 60), 2)
+    return placeholder
+
+def publish_output_frame(frame):
+    """
+    Make `frame` the current output for snapshots and /video_feed viewers.
+    Pass a callable to render lazily: it only runs if someone reads the frame.
+    """
+    state.broadcaster.publish(frame)
+
+def inference_worker():
+    """Stage 2: batch the freshest frame from every camera through the engine."""
+    engine = get_engine()
+    print("🚀 Inference Started")
+    
+    while state.running:
+        latest = state.pipeline.wait_for_frames(timeout=0.1, max_batch=MAX_BATCH)
+        if not latest:
+            continue
+        
+        camera_ids = list(latest.keys())
+        timestamps = [latest[cam_id][0] for cam_id in camera_ids]
+        captured_at = min(timestamps)
+        frames = [latest[cam_id][1] for cam_id in camera_ids]
+        
+        # One batched forward pass for all cameras (headless: no drawing here)
+        outputs = engine.detect_batch(frames, camera_ids, conf_threshold=0.5, timestamps=timestamps)
+        state.telemetry.tick('inference', len(frames))
+        state.pipeline.encode_queue.put((captured_at, camera_ids, outputs))
+    
+    print("🛑 Inference Stopped")
+
+def encode_worker():
+    """Stage 3: clip pre-roll, alert dispatch, grid composition and publishing."""
+    placeholder = make_placeholder_frame()
+    views = {}  # Latest annotated frame per camera (a batch may hold only some cameras)
+    print("🎞️ Encoder Started")
     
-    while state.running and cap.isOpened():
+    while state.running:
         # Check if camera is enabled
         if not state.camera_enabled:
-            with state.lock:
-                state.output_frame = placeholder.copy()
+            publish_output_frame(placeholder)
             time.sleep(0.1)  # Reduce CPU when disabled
             continue
-            
-        ret, frame = cap.read()
-        if not ret:
-            continue
-            
-        annotated_frame, status_data = engine.process_frame(frame, conf_threshold=0.5)
-        
-        # Store frame for GIF buffer
-        state.frame_buffer.append(annotated_frame.copy())
         
-        # Alert Logic
-        is_threat = status_data['weapon_detected'] or status_data['fall_detected']
-        curr_time = time.time()
+        item = state.pipeline.encode_queue.get(timeout=0.1)
+        if item is None:
+            continue
+        captured_at, camera_ids, outputs = item
+        views.update((cam_id, annotated) for cam_id, (annotated, _) in zip(camera_ids, outputs))
         
-        if is_threat and (curr_time - last_alert_time > 5.0):
-            last_alert_time = curr_time
+        for cam_id, (annotated, status_data) in zip(camera_ids, outputs):
+            # Clip pre-roll: raw frame compressed on the recorder's thread, overlays drawn only if a clip is written
+            recorder.add_frame(cam_id, annotated.result.timestamp, annotated.frame, annotated.overlay())
             
-            alert_type = "CRITICAL THREAT"
-            if status_data['weapon_detected']: alert_type = "WEAPON DETECTED"
-            if status_data['fall_detected']: alert_type = "PERSON DOWN"
-            
-            # Log to history
-            state.threat_history.append({
-                "type": alert_type,
-                "time": datetime.now().strftime("%H:%M:%S"),
-                "zone": "NORTH SECTOR"
-            })
-            
-            # Broadcast
-            threading.Thread(target=bot.broadcast_alert, args=(alert_type, annotated_frame), daemon=True).start()
+            # Alert Logic: one outbox entry per threat type; repeats within the window coalesce
+            zone = zone_for_camera(cam_id)["name"]
+            for flag, alert_type, mask in (('weapon_detected', "WEAPON DETECTED", 'weapon_mask'),
+                                           ('fall_detected', "PERSON DOWN", 'fall_mask'),
+                                           ('sos_detected', "SOS SIGNAL", 'sos_mask')):
+                if not status_data[flag]:
+                    continue
+                result = annotated.result
+                alert_id = outbox.submit(cam_id, alert_type, lambda a=annotated: encode_jpeg(a.image()),
+                                         zone=zone, captured_at=result.timestamp)
+                if alert_id is not None:
+                    # Follow the alert photo with pre/post-roll footage once the clip is written;
+                    # the upload and fan-out run on the Telegram client, keeping the writer free
+                    recorder.trigger(cam_id, alert_type,
+                                     on_done=lambda clip, t=alert_type, z=zone:
+                                         bot.client.submit(bot.broadcast_clip, clip, t, z))
+                    # Log to history (batched to disk by the event store's writer)
+                    confidences = result.confidences[getattr(result, mask)]
+                    event_store.record(cam_id, alert_type, ts=result.timestamp, zone=zone,
+                                       threat_level=result.threat_level,
+                                       confidence=confidences.max() if len(confidences) else None,
+                                       persons=int(result.person_mask.sum()), alert_id=alert_id)
         
-        # Grid Mode
+        # Grid Mode (rendered lazily, only if a viewer or snapshot reads it)
+        primary = min(views)
         if state.grid_mode:
-            h, w = annotated_frame.shape[:2]
-            small = cv2.resize(annotated_frame, (w//2, h//2))
-            top = cv2.hconcat([small, small])
-            bottom = cv2.hconcat([small, small])
-            final_frame = cv2.vconcat([top, bottom])
-        else:
-            final_frame = annotated_frame
+            grid = [views[cam_id] for cam_id in sorted(views)[:4]]
+            publish_output_frame(lambda: build_grid([a.image() for a in grid]))
+        elif primary in camera_ids:
+            publish_output_frame(views[primary].image)
+        state.pipeline.record_latency(captured_at)
+        state.telemetry.observe('end_to_end', (time.time() - captured_at) * 1000)
+        state.telemetry.tick('output')
+        stats_hub.notify()
+    
+    print("🛑 Encoder Stopped")
 
-        with state.lock:
-            state.output_frame = final_frame.copy()
-            
-        time.sleep(0.01)
-        
-    cap.release()
-    print("🛑 Video Loop Stopped")
+def start_video_pipeline():
+    """Start one capture thread per source plus the inference and encode workers."""
+    print("🚀 Video Pipeline Started")
+    cameras.start()
+    threading.Thread(target=inference_worker, daemon=True).start()
+    threading.Thread(target=encode_worker, daemon=True).start()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     state.running = True
     state.bot_running = True
+    state.broadcaster.attach_loop(asyncio.get_running_loop())
+    stats_hub.attach_loop(asyncio.get_running_loop())
     
-    t_video = threading.Thread(target=video_processing_loop, daemon=True)
-    t_video.start()
+    start_video_pipeline()
+    outbox.start()
+    event_store.start()
+    recorder.start()
     
     t_bot = threading.Thread(target=bot.poll, daemon=True)
     t_bot.start()
@@ -573,6 +830,10 @@ async def lifespan(app: FastAPI):
     yield
     state.running = False
     state.bot_running = False
+    outbox.stop()
+    event_store.stop()
+    recorder.stop()
+    cameras.stop()
 
 app = FastAPI(title="CityWatch API", version="2.0 SuperBot", lifespan=lifespan)
 
@@ -589,21 +850,144 @@ app.add_middleware(
 def health_check():
     return {"status": "online", "system": "CityWatch SuperBot", "users": len(state.bot_users)}
 
+def build_stats():
+    """Dashboard stats snapshot shared by /stats and /stats/stream. None while initializing."""
+    if not state.engine:
+        return None
+    stats = state.engine.get_statistics()
+    stats['grid_mode'] = state.grid_mode
+    stats['bot_users'] = len(state.bot_users)
+    stats['camera_enabled'] = state.camera_enabled
+    stats['weapon_detected'] = state.engine.status_flags['weapon_detected']
+    stats['fall_detected'] = state.engine.status_flags['fall_detected']
+    stats['sos_detected'] = state.engine.status_flags['sos_detected']
+    stats['threat_level'] = int(state.engine.threat_series.latest)
+    stats['fps'] = round(state.telemetry.fps('output'), 1)
+    return stats
+
+stats_hub = StatsHub(build_stats)
+
 @app.get("/stats")
 def get_stats():
-    if state.engine:
-        stats = state.engine.get_statistics()
-        stats['grid_mode'] = state.grid_mode
-        stats['bot_users'] = len(state.bot_users)
-        stats['weapon_detected'] = state.engine.status_flags['weapon_detected']
-        stats['fall_detected'] = state.engine.status_flags['fall_detected']
-        stats['sos_detected'] = state.engine.status_flags['sos_detected']
+    stats = build_stats()
+    if stats is not None:
         return stats
     return {"status": "initializing"}
 
+async def generate_stats_events(max_rate: float):
+    """SSE framing for StatsHub deltas."""
+    async for delta in stats_hub.stream(max_rate=max_rate):
+        yield f"data: {json.dumps(delta)}\n\n"
+
+@app.get("/stats/stream")
+async def stats_stream(max_rate: float = Query(5.0, gt=0, le=30, description="Max updates per second")):
+    """Server-Sent Events: full stats first, then deltas when flags/threat level/counters change."""
+    return StreamingResponse(generate_stats_events(max_rate), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/pipeline_stats")
+def get_pipeline_stats():
+    """Per-stage queue depth, drop counts and end-to-end latency."""
+    stats = state.pipeline.stats()
+    stats['broadcaster'] = state.broadcaster.stats()
+    stats['stats_stream'] = stats_hub.stats()
+    stats['telemetry'] = state.telemetry.snapshot()
+    stats['telegram'] = bot.client.stats()
+    stats['alert_outbox'] = outbox.stats()
+    stats['event_store'] = event_store.stats()
+    stats['clip_recorder'] = recorder.stats()
+    stats['cameras'] = cameras.stats()
+    if state.engine:
+        stats['threat_series'] = state.engine.threat_series.stats()
+        stats['detector'] = state.engine.detector.stats()
+    return stats
+
+def collect_pipeline_metrics():
+    """Scrape-time metric families from the queues, engine and broadcaster."""
+    pipeline = state.pipeline.stats()
+    queues = pipeline['queues']
+    camera_stats = cameras.stats()
+    families = [
+        ('frames_dropped_total', 'counter', "Frames discarded by a full pipeline queue.",
+         [({'queue': name}, q['dropped']) for name, q in queues.items()]),
+        ('queue_depth', 'gauge', "Items waiting in a pipeline queue.",
+         [({'queue': name}, q['depth']) for name, q in queues.items()]),
+        ('mjpeg_subscribers', 'gauge', "Connected /video_feed viewers.",
+         [({}, state.broadcaster.subscribers)]),
+        ('jpeg_encodes_total', 'counter', "JPEG encodes performed by the broadcaster.",
+         [({}, state.broadcaster.encode_count)]),
+        ('stats_stream_subscribers', 'gauge', "Connected /stats/stream clients.",
+         [({}, stats_hub.subscribers)]),
+        ('alerts_queued', 'gauge', "Alerts waiting in the outbox.",
+         [({}, outbox.stats()['queued'])]),
+        ('alerts_coalesced_total', 'counter', "Repeat events folded into an existing alert.",
+         [({}, outbox.coalesced)]),
+        ('camera_enabled', 'gauge', "1 while cameras are enabled (privacy mode off).",
+         [({}, state.camera_enabled)]),
+        ('camera_up', 'gauge', "1 while a camera source is delivering frames.",
+         [({'camera': c['camera_id'], 'zone': c['zone']}, c['status'] == 'live') for c in camera_stats]),
+        ('camera_reconnects_total', 'counter', "Times a camera source was reopened after a failure.",
+         [({'camera': c['camera_id'], 'zone': c['zone']}, c['reconnects']) for c in camera_stats]),
+    ]
+    engine = state.engine
+    if engine is not None:
+        families += [
+            ('frames_processed_total', 'counter', "Frames analysed by the engine.", [({}, engine.frames_processed)]),
+            ('detections_run_total', 'counter', "Frames that went through the detector.", [({}, engine.detections_run)]),
+            ('motion_skips_total', 'counter', "Detector runs skipped by the motion gate.", [({}, engine.motion_skips)]),
+            ('frames_rendered_total', 'counter', "Frames annotated on demand.", [({}, engine.frames_rendered)]),
+            ('threats_today', 'gauge', "Threat incidents since local midnight.", [({}, engine.threats_detected_today)]),
+            ('threat_level', 'gauge', "Latest threat level (0-100).", [({}, engine.threat_series.latest)]),
+        ]
+    return families
+
+state.telemetry.add_collector(collect_pipeline_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition: stage latency histograms, fps, drops and counters."""
+    return PlainTextResponse(state.telemetry.render_prometheus(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/threat_timeline")
+def get_threat_timeline(start: Optional[float] = Query(None, description="Window start (unix seconds)"),
+                        end: Optional[float] = Query(None, description="Window end (unix seconds)"),
+                        resolution: str = Query("auto", pattern="^(auto|raw|1s|1m|1h)$"),
+                        max_points: int = Query(500, ge=10, le=10000, description="Point budget for 'auto'")):
+    """Threat level over a window at raw/1s/1m/1h resolution (min/max/mean per bucket)."""
+    if not state.engine:
+        return {"status": "initializing"}
+    if start is None and end is None:
+        end = time.time()
+        start = end - 3600
+    timeline = state.engine.get_threat_timeline(start, end, resolution, max_points)
+    return {key: value if isinstance(value, str) else np.round(value, 2).tolist()
+            for key, value in timeline.items()}
+
+@app.get("/events")
+def get_events(start: Optional[float] = Query(None, description="Range start (unix seconds, inclusive)"),
+               end: Optional[float] = Query(None, description="Range end (unix seconds, exclusive)"),
+               camera_id: Optional[str] = Query(None),
+               zone: Optional[str] = Query(None, description="e.g. NORTH SECTOR"),
+               type: Optional[str] = Query(None, description="e.g. WEAPON DETECTED"),
+               limit: int = Query(100, ge=1, le=1000),
+               cursor: Optional[str] = Query(None, description="next_cursor from the previous page")):
+    """Threat events newest first, filtered by time range/camera/zone/type, keyset-paginated."""
+    try:
+        return event_store.query(start, end, camera_id, zone, type, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/events/counts")
+def get_event_counts(start: Optional[float] = Query(None), end: Optional[float] = Query(None),
+                     camera_id: Optional[str] = Query(None), zone: Optional[str] = Query(None)):
+    """Number of threat events per type in a time range."""
+    return event_store.counts(start, end, camera_id, zone)
+
 @app.post("/toggle_grid")
 def toggle_grid_view():
     state.grid_mode = not state.grid_mode
+    stats_hub.notify()
     return {"grid_mode": state.grid_mode}
 
 @app.post("/connect_bot")
@@ -616,6 +1000,7 @@ def toggle_camera():
     state.camera_enabled = not state.camera_enabled
     status = "enabled" if state.camera_enabled else "disabled"
     print(f"[CAMERA] Camera {status}")
+    stats_hub.notify()
     return {"camera_enabled": state.camera_enabled, "status": status}
 
 @app.get("/camera_status")
@@ -623,21 +1008,42 @@ def get_camera_status():
     """Get current camera status."""
     return {"camera_enabled": state.camera_enabled}
 
-def generate_mjpeg():
-    while True:
-        with state.lock:
-            if state.output_frame is None:
-                time.sleep(0.01)
+@app.get("/cameras")
+def get_cameras():
+    """Per-source health: zone, status, fps, reconnects and time since the last frame."""
+    return {"camera_enabled": state.camera_enabled, "cameras": cameras.stats()}
+
+async def generate_mjpeg(fps: float = 30.0, width: Optional[int] = None):
+    """
+    Stream the shared JPEG of every new frame; slow clients skip to the newest.
+    Awaits the broadcaster's frame-ready event, so idle viewers cost no CPU
+    and no threadpool worker.
+    """
+    min_interval = 1.0 / fps
+    last_seq = 0
+    last_sent = 0.0
+    state.broadcaster.add_subscriber()
+    try:
+        while True:
+            # Per-client frame-rate cap, then take the freshest frame
+            delay = last_sent + min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            
+            seq, jpeg = await state.broadcaster.wait_for_jpeg_async(last_seq, timeout=1.0, width=width)
+            if jpeg is None:
                 continue
-            (flag, encodedImage) = cv2.imencode(".jpg", state.output_frame)
-            if not flag: continue
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + bytearray(encodedImage) + b'\r\n')
-        time.sleep(0.033)
+            last_seq = seq
+            last_sent = time.monotonic()
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+    finally:
+        state.broadcaster.remove_subscriber()
 
 @app.get("/video_feed")
-def video_feed():
-    return StreamingResponse(generate_mjpeg(), media_type="multipart/x-mixed-replace; boundary=frame")
+async def video_feed(fps: float = Query(30.0, gt=0, le=60, description="Max frames per second for this client"),
+                     width: Optional[int] = Query(None, ge=64, le=3840, description="Downscale frames to this width")):
+    return StreamingResponse(generate_mjpeg(fps, width), media_type="multipart/x-mixed-replace; boundary=frame")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,263 @@
+"""
+CityWatch - Engine Benchmark Suite
+Feeds recorded or synthetic frames through CityWatchEngine.process_frame at
+several resolutions and person/weapon densities, and reports p50/p95/p99
+latency per stage (inference, tracking, fall, SOS, drawing, encoding) plus
+throughput. Results are written as JSON so runs can be compared between commits.
+
+Usage:
+    python benchmark.py                                # synthetic frames, default matrix
+    python benchmark.py --video clip.mp4 --out bench.json
+    python benchmark.py --compare old.json --out new.json
+    python benchmark.py --backend onnx --threads 4     # CPU runtime comparison
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from detectors import BACKENDS
+from logic_core import CityWatchEngine
+
+STAGES = ('inference', 'tracking', 'fall', 'sos', 'draw', 'encode', 'total')
+
+
+class SyntheticDensityEngine(CityWatchEngine):
+    """
+    Engine whose detector output is replaced with synthetic person/weapon boxes.
+    YOLO still runs on every frame (so inference timing is real); only the
+    boxes fed to post-processing are synthetic, giving exact crowd densities.
+    """
+
+    def __init__(self, persons: int, weapons: int, seed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.persons = persons
+        self.weapons = weapons
+        self._rng = np.random.default_rng(seed)
+        self._base = None
+
+    def _synthetic_boxes(self, width: int, height: int) -> np.ndarray:
+        """People drift a few pixels per frame so the tracker has real work to do."""
+        if self._base is None or self._base[1] != (width, height):
+            rng = self._rng
+            w = rng.uniform(40, 120, self.persons)
+            h = rng.uniform(120, 300, self.persons)
+            # Every 5th person is lying down low in the frame (exercises fall detection)
+            lying = np.arange(self.persons) % 5 == 4
+            w, h = np.where(lying, h, w), np.where(lying, w * 0.5, h)
+            x = rng.uniform(0, width - w)
+            low = np.where(lying, height * 0.7, 0)
+            y = low + rng.uniform(0, 1, self.persons) * np.maximum(height - h - low, 0)
+            persons = np.column_stack((x, y, x + w, y + h, rng.uniform(0.4, 0.95, self.persons),
+                                       np.full(self.persons, self.PERSON_CLASS)))
+            wx = rng.uniform(0, width - 40, self.weapons)
+            wy = rng.uniform(0, height - 40, self.weapons)
+            weapons = np.column_stack((wx, wy, wx + 30, wy + 30, rng.uniform(0.4, 0.95, self.weapons),
+                                       np.full(self.weapons, self.KNIFE_CLASS)))
+            self._base = (np.vstack((persons, weapons)).astype(np.float32), (width, height))
+
+        boxes = self._base[0].copy()
+        boxes[:, :4] += self._rng.normal(0, 2, (len(boxes), 1)).astype(np.float32)
+        return boxes
+
+    def _run_inference(self, frames: List[np.ndarray], conf_threshold: float,
+                       imgsz: Optional[int] = None) -> List[np.ndarray]:
+        super()._run_inference(frames, conf_threshold, imgsz)
+        return [self._synthetic_boxes(frame.shape[1], frame.shape[0]) for frame in frames]
+
+
+def load_frames(video: Optional[str], frames_dir: Optional[str], limit: int) -> List[np.ndarray]:
+    """Recorded frames from a video file or image folder (empty list if neither given)."""
+    frames = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    elif frames_dir:
+        for name in sorted(os.listdir(frames_dir)):
+            frame = cv2.imread(os.path.join(frames_dir, name))
+            if frame is not None:
+                frames.append(frame)
+            if len(frames) >= limit:
+                break
+    return frames
+
+
+def synthetic_frames(width: int, height: int, count: int, seed: int = 0) -> List[np.ndarray]:
+    """Textured frames with a moving block so codecs and the detector see changing content."""
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (9, 9), 0)
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        x = (i * 7) % max(1, width - 80)
+        cv2.rectangle(frame, (x, height // 3), (x + 80, height // 3 + 160), (40, 40, 200), -1)
+        frames.append(frame)
+    return frames
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {'p50': round(p50, 3), 'p95': round(p95, 3), 'p99': round(p99, 3),
+            'mean': round(float(arr.mean()), 3)}
+
+
+def run_scenario(engine: CityWatchEngine, frames: List[np.ndarray], warmup: int,
+                 iterations: int) -> Dict[str, Any]:
+    """Time process_frame + JPEG encode per frame; returns per-stage percentiles and fps."""
+    samples = {stage: [] for stage in STAGES}
+
+    for i in range(warmup + iterations):
+        frame = frames[i % len(frames)]
+        started = time.perf_counter()
+        annotated, _ = engine.process_frame(frame, conf_threshold=0.5)
+        encode_start = time.perf_counter()
+        cv2.imencode('.jpg', annotated)
+        finished = time.perf_counter()
+
+        if i < warmup:
+            continue
+        for stage in ('inference', 'tracking', 'fall', 'sos', 'draw'):
+            samples[stage].append(engine.stage_ms[stage])
+        samples['encode'].append((finished - encode_start) * 1000)
+        samples['total'].append((finished - started) * 1000)
+
+    total_s = sum(samples['total']) / 1000
+    return {
+        'frames': iterations,
+        'fps': round(iterations / total_s, 2) if total_s > 0 else 0.0,
+        'stages_ms': {stage: percentiles(values) for stage, values in samples.items()}
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]):
+    """Print p50/p95 total latency and fps deltas against an earlier run."""
+    old = {(s['resolution'], s['persons']): s for s in previous.get('scenarios', [])}
+    print(f"\n[Bench] Compared with {previous.get('meta', {}).get('commit') or 'previous run'}:")
+    for scenario in current['scenarios']:
+        before = old.get((scenario['resolution'], scenario['persons']))
+        if before is None:
+            continue
+        for key in ('p50', 'p95'):
+            a = before['stages_ms']['total'][key]
+            b = scenario['stages_ms']['total'][key]
+            change = (b - a) / a * 100 if a else 0.0
+            print(f"  {scenario['resolution']:>10} persons={scenario['persons']:<3} "
+                  f"total {key}: {a:8.2f} -> {b:8.2f} ms ({change:+.1f}%)")
+        print(f"  {scenario['resolution']:>10} persons={scenario['persons']:<3} "
+              f"fps: {before['fps']:.2f} -> {scenario['fps']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CityWatch engine benchmark")
+    parser.add_argument('--resolutions', default='640x480,1280x720,1920x1080',
+                        help="Comma-separated WxH list")
+    parser.add_argument('--densities', default='0,5,20,50',
+                        help="Comma-separated persons per frame (1 weapon per 5 persons)")
+    parser.add_argument('--video', help="Recorded video to use instead of synthetic frames")
+    parser.add_argument('--frames-dir', help="Folder of recorded frames to use instead of synthetic frames")
+    parser.add_argument('--real-detections', action='store_true',
+                        help="Use YOLO's own boxes on recorded frames instead of synthetic densities")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--device', default=None, help="Force 'cpu' (default: engine's choice)")
+    parser.add_argument('--backend', default='auto', choices=BACKENDS, help="Detector runtime")
+    parser.add_argument('--threads', type=int, default=None, help="Intra-op threads for onnx/openvino")
+    parser.add_argument('--weights', default='yolov8n.pt', help="Detector weights (e.g. a pruned head)")
+    parser.add_argument('--all-classes', action='store_true',
+                        help="Decode all 80 COCO classes instead of only the ones CityWatch uses")
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', help="Earlier JSON result to diff against")
+    args = parser.parse_args()
+    try:
+        import torch  # Only for the report metadata; CPU nodes may run ONNX/OpenVINO without it
+        torch_version = torch.__version__
+    except ImportError:
+        torch_version = None
+
+    resolutions = [tuple(int(v) for v in r.lower().split('x')) for r in args.resolutions.split(',')]
+    densities = [int(d) for d in args.densities.split(',')]
+    recorded = load_frames(args.video, args.frames_dir, args.warmup + args.iterations)
+    if args.real_detections and not recorded:
+        parser.error("--real-detections needs --video or --frames-dir")
+
+    scenarios = []
+    device = detector = None
+    for width, height in resolutions:
+        if recorded:
+            frames = [cv2.resize(f, (width, height)) for f in recorded]
+        else:
+            frames = synthetic_frames(width, height, 30)
+
+        for persons in ([None] if args.real_detections else densities):
+            # Full work per frame: no skipping, no motion gate
+            options = dict(idle_detect_interval=1, motion_gate=False, backend=args.backend,
+                           threads=args.threads, device=args.device, weights=args.weights,
+                           class_filter=not args.all_classes)
+            if persons is None:
+                engine = CityWatchEngine(**options)
+            else:
+                engine = SyntheticDensityEngine(persons, persons // 5, **options)
+            device, detector = engine.device, engine.detector.stats()
+
+            label = 'real' if persons is None else persons
+            print(f"[Bench] {width}x{height} persons={label} ...")
+            result = run_scenario(engine, frames, args.warmup, args.iterations)
+            result.update({'resolution': f"{width}x{height}", 'persons': label,
+                           'weapons': None if persons is None else persons // 5})
+            scenarios.append(result)
+
+            stages = result['stages_ms']
+            print(f"        {result['fps']:7.2f} fps | total p50 {stages['total']['p50']:.2f} ms "
+                  f"p95 {stages['total']['p95']:.2f} ms p99 {stages['total']['p99']:.2f} ms | "
+                  f"inference p50 {stages['inference']['p50']:.2f} ms")
+            engine.release()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'device': device,
+            'detector': detector,
+            'class_filter': not args.all_classes,
+            'cpu': platform.processor() or platform.machine(),
+            'python': platform.python_version(),
+            'torch': torch_version,
+            'opencv': cv2.__version__,
+            'source': args.video or args.frames_dir or 'synthetic',
+            'warmup': args.warmup,
+            'iterations': args.iterations
+        },
+        'scenarios': scenarios
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"[Bench] Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+CityWatch - Event Clip Recorder
+Keeps a few seconds of pre-roll per camera as JPEG-compressed frames in a
+fixed-size ring. When an event fires, pre-roll plus post-roll is written to
+an MP4 (MJPEG AVI fallback) by a background writer. Overlays are drawn only
+then, so buffering never renders frames nobody will see.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from pipeline import DropOldestQueue
+
+Overlay = Callable[[np.ndarray], np.ndarray]
+# (timestamp, raw-frame JPEG, overlay drawn at write time, original (height, width))
+BufferedFrame = Tuple[float, bytes, Optional[Overlay], Tuple[int, int]]
+
+
+class Clip:
+    """A finished clip on disk."""
+    __slots__ = ('camera_id', 'path', 'reason', 'start', 'end', 'frames')
+
+    def __init__(self, camera_id: Hashable, path: str, reason: str, start: float, end: float, frames: int):
+        self.camera_id = camera_id
+        self.path = path
+        self.reason = reason
+        self.start = start
+        self.end = end
+        self.frames = frames
+
+    @property
+    def key(self) -> Tuple[str, float, float]:
+        """Identifies the footage (same camera and time span = same clip)."""
+        return str(self.camera_id), self.start, self.end
+
+
+class _ClipJob:
+    __slots__ = ('camera_id', 'reason', 'frames', 'until', 'callbacks')
+
+    def __init__(self, camera_id: Hashable, reason: str, frames: List[BufferedFrame], until: float):
+        self.camera_id = camera_id
+        self.reason = reason
+        self.frames = frames
+        self.until = until
+        self.callbacks: List[Callable[[Clip], None]] = []
+
+
+class ClipRecorder:
+    """
+    add_frame() is cheap for the video thread: frames are sampled at `fps`
+    and handed to an ingest thread that JPEG-compresses the raw pixels into
+    the per-camera ring, next to an optional overlay for the writer to draw. trigger() snapshots the pre-roll, keeps
+    collecting for `post_roll` seconds and queues the clip for the writer.
+    Overlapping triggers on one camera share a single clip.
+    """
+
+    def __init__(self, output_dir: str, pre_roll: float = 5.0, post_roll: float = 5.0,
+                 fps: float = 10.0, jpeg_quality: int = 75, max_width: int = 640,
+                 max_clips: int = 200):
+        self.output_dir = output_dir
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.fps = fps
+        self.jpeg_quality = jpeg_quality
+        self.max_width = max_width
+        self.max_clips = max_clips
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._rings: Dict[Hashable, deque] = {}
+        self._last_sample: Dict[Hashable, float] = {}
+        self._jobs: Dict[Hashable, _ClipJob] = {}
+        self._lock = threading.Lock()
+        self._ingest = DropOldestQueue(maxsize=8, name="clip_ingest")
+        self._writes: "queue.Queue[Optional[_ClipJob]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self.running = False
+
+        # Counters for /pipeline_stats
+        self.frames_buffered = 0
+        self.clips_written = 0
+        self.write_failures = 0
+
+    # === INGEST ===
+    def add_frame(self, camera_id: Hashable, timestamp: float, frame: Any,
+                  overlay: Optional[Overlay] = None):
+        """
+        Offer a frame (array, or zero-arg callable rendering one). Only one
+        frame per 1/fps seconds per camera is kept; JPEG encoding happens on
+        the ingest thread. overlay(frame) -> annotated copy is called by the
+        writer, only for frames that end up in a clip.
+        """
+        if timestamp - self._last_sample.get(camera_id, float('-inf')) < 1.0 / self.fps:
+            return
+        self._last_sample[camera_id] = timestamp
+        self._ingest.put((camera_id, timestamp, frame, overlay))
+
+    def _compress(self, frame: np.ndarray) -> Optional[bytes]:
+        if self.max_width and frame.shape[1] > self.max_width:
+            height = int(frame.shape[0] * self.max_width / frame.shape[1])
+            frame = cv2.resize(frame, (self.max_width, height), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        return encoded.tobytes() if ok else None
+
+    def _ingest_loop(self):
+        while self.running:
+            item = self._ingest.get(timeout=0.25)
+            if item is not None:
+                camera_id, timestamp, frame, overlay = item
+                if callable(frame):
+                    frame = frame()
+                jpeg = self._compress(frame)
+                if jpeg is not None:
+                    buffered = (timestamp, jpeg, overlay, frame.shape[:2])
+                    with self._lock:
+                        ring = self._rings.get(camera_id)
+                        if ring is None:
+                            ring = self._rings[camera_id] = deque(maxlen=max(1, int(self.pre_roll * self.fps)))
+                        ring.append(buffered)
+                        job = self._jobs.get(camera_id)
+                        if job is not None and timestamp <= job.until:
+                            job.frames.append(buffered)
+                    self.frames_buffered += 1
+            self._finish_due_jobs()
+
+    def _finish_due_jobs(self, force: bool = False):
+        """Hand clips whose post-roll has elapsed to the writer."""
+        now = time.time()
+        with self._lock:
+            due = [cam for cam, job in self._jobs.items() if force or now > job.until]
+            for camera_id in due:
+                self._writes.put(self._jobs.pop(camera_id))
+
+    # === TRIGGER ===
+    def trigger(self, camera_id: Hashable, reason: str = "event",
+                on_done: Optional[Callable[[Clip], None]] = None,
+                post_roll: Optional[float] = None) -> bool:
+        """
+        Start a clip for `camera_id`: current pre-roll plus `post_roll` seconds
+        (default self.post_roll; 0 = pre-roll only). on_done(clip) runs on the
+        writer thread once the file exists, so it should only hand the clip off
+        (e.g. to an upload pool). Returns False if nothing is buffered.
+        """
+        post_roll = self.post_roll if post_roll is None else post_roll
+        with self._lock:
+            job = self._jobs.get(camera_id)
+            if job is None:
+                ring = self._rings.get(camera_id)
+                if not ring:
+                    return False
+                job = _ClipJob(camera_id, reason, list(ring), time.time() + post_roll)
+                if post_roll > 0:
+                    self._jobs[camera_id] = job
+                else:
+                    self._writes.put(job)  # Pre-roll only: write right away
+            if on_done:
+                job.callbacks.append(on_done)
+        return True
+
+    # === WRITER ===
+    def _decode(self, buffered: BufferedFrame) -> np.ndarray:
+        """JPEG back to pixels, with the overlay drawn at the original resolution."""
+        _, jpeg, overlay, shape = buffered
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        if overlay is None:
+            return frame
+        small = frame.shape[:2]
+        if small != shape:
+            frame = cv2.resize(frame, (shape[1], shape[0]), interpolation=cv2.INTER_LINEAR)
+        frame = overlay(frame)
+        if small != shape:
+            frame = cv2.resize(frame, (small[1], small[0]), interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _write(self, job: _ClipJob) -> Optional[Clip]:
+        frames = job.frames
+        if not frames:
+            return None
+        first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+        height, width = first.shape[:2]
+        stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(frames[0][0]))
+        reason = ''.join(c if c.isalnum() else '_' for c in job.reason.lower())
+        base = os.path.join(self.output_dir,
+                            f"cam{job.camera_id}_{stamp}_{int(frames[0][0] * 1000) % 1000:03d}_{reason}")
+
+        # MP4 where the OpenCV build has an encoder, otherwise MJPEG in AVI
+        for ext, fourcc in (('.mp4', 'mp4v'), ('.avi', 'MJPG')):
+            writer = cv2.VideoWriter(base + ext, cv2.VideoWriter_fourcc(*fourcc), self.fps, (width, height))
+            if writer.isOpened():
+                break
+            writer.release()
+        else:
+            return None
+
+        try:
+            for buffered in frames:
+                frame = self._decode(buffered)
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height))
+                writer.write(frame)
+        finally:
+            writer.release()
+        return Clip(job.camera_id, base + ext, job.reason, frames[0][0], frames[-1][0], len(frames))
+
+    def _prune(self):
+        """Keep only the newest max_clips files."""
+        paths = [os.path.join(self.output_dir, name) for name in os.listdir(self.output_dir)
+                 if name.endswith(('.mp4', '.avi'))]
+        if len(paths) > self.max_clips:
+            for path in sorted(paths, key=os.path.getmtime)[:len(paths) - self.max_clips]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _write_loop(self):
+        while True:
+            job = self._writes.get()
+            if job is None:
+                break
+            try:
+                clip = self._write(job)
+            except Exception as e:
+                print(f"[CLIP] Write failed: {e}")
+                clip = None
+            if clip is None:
+                self.write_failures += 1
+                continue
+            self.clips_written += 1
+            self._prune()
+            for callback in job.callbacks:
+                try:
+                    callback(clip)
+                except Exception as e:
+                    print(f"[CLIP] Callback failed: {e}")
+
+    # === LIFECYCLE ===
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._threads = [threading.Thread(target=self._ingest_loop, name="clip-ingest", daemon=True),
+                         threading.Thread(target=self._write_loop, name="clip-writer", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop ingesting, write clips still collecting post-roll, then stop the writer."""
+        if not self.running:
+            return
+        self.running = False
+        ingest, writer = self._threads
+        ingest.join(timeout)
+        self._finish_due_jobs(force=True)
+        self._writes.put(None)
+        writer.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Buffered pre-roll size and clip counters."""
+        with self._lock:
+            buffered = {str(cam): len(ring) for cam, ring in self._rings.items()}
+            memory = sum(len(buffered[1]) for ring in self._rings.values() for buffered in ring)
+            active = len(self._jobs)
+        return {
+            'pre_roll_frames': buffered,
+            'pre_roll_bytes': memory,
+            'recording': active,
+            'frames_buffered': self.frames_buffered,
+            'clips_written': self.clips_written,
+            'write_failures': self.write_failures,
+            'ingest': self._ingest.stats()
+        }
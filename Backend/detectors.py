@@ -0,0 +1,413 @@
+"""
+CityWatch - Detector Backends
+Pluggable object detectors behind one interface. Every backend returns, per
+frame, an (N,6) float32 array of x1, y1, x2, y2, conf, cls in frame pixels
+with COCO class ids, so the engine's post-processing never sees which runtime
+produced the boxes.
+
+Backends:
+    torch     - Ultralytics YOLO on PyTorch (CUDA when available)
+    onnx      - ONNX Runtime on CPU, exported yolov8n.onnx
+    openvino  - OpenVINO on CPU, same exported model
+
+Input size: detect(..., imgsz=N) letterboxes to N (a multiple of 32) for
+that call, so cameras can trade compute for recall individually. Exported
+models with a static input shape ignore it and always use their own size.
+
+Class filtering: detect(..., classes=[...]) keeps only the given COCO ids,
+applied before NMS. A pruned head trained on fewer classes (e.g. only the
+ones CityWatch uses) also works: its class names are mapped back to COCO ids.
+
+Precision:
+    fp32      - everywhere
+    fp16      - PyTorch on CUDA, OpenVINO on CPUs with native FP16
+    int8      - ONNX Runtime / OpenVINO on yolov8n.int8.onnx (see quantize.py)
+"""
+
+import ast
+import importlib.util
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+COCO_NAMES = (
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat', 'traffic light',
+    'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep', 'cow',
+    'elephant', 'bear', 'zebra', 'giraffe', 'backpack', 'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee',
+    'skis', 'snowboard', 'sports ball', 'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard',
+    'tennis racket', 'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+    'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair', 'couch',
+    'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse', 'remote', 'keyboard',
+    'cell phone', 'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'book', 'clock', 'vase',
+    'scissors', 'teddy bear', 'hair drier', 'toothbrush'
+)
+
+
+def read_model_names(path: str) -> Optional[Dict[int, str]]:
+    """Class names the Ultralytics exporter stored with an .onnx / OpenVINO model, or None."""
+    try:
+        if path.endswith('.onnx'):
+            import onnx
+            props = {p.key: p.value for p in onnx.load(path, load_external_data=False).metadata_props}
+            names = props.get('names')
+        else:
+            import yaml
+            with open(os.path.join(os.path.dirname(path), 'metadata.yaml')) as f:
+                names = yaml.safe_load(f).get('names')
+    except Exception:
+        return None
+    return ast.literal_eval(names) if isinstance(names, str) else names
+
+
+class Detector:
+    """Base detector: detect() maps a list of BGR frames to (N,6) arrays."""
+
+    name = "base"
+    device = "cpu"
+    precision = "fp32"
+    class_map: Optional[np.ndarray] = None  # Model class index -> COCO id (-1 = not in COCO); None = COCO head
+
+    def set_class_names(self, names: Optional[Dict[int, str]]):
+        """Map a non-COCO (pruned) head's class names onto COCO ids."""
+        if not names or [names[i] for i in sorted(names)] == list(COCO_NAMES):
+            self.class_map = None
+            return
+        index = {name: i for i, name in enumerate(COCO_NAMES)}
+        self.class_map = np.array([index.get(names[i], -1) for i in sorted(names)], dtype=np.int64)
+        print(f"[CityWatch] Pruned head: {len(names)} classes ({', '.join(names[i] for i in sorted(names))})")
+
+    @staticmethod
+    def class_lookup(classes: Optional[Sequence[int]]) -> Optional[np.ndarray]:
+        """Boolean table over COCO ids (plus a trailing False for -1) for the wanted classes."""
+        if classes is None:
+            return None
+        lookup = np.zeros(len(COCO_NAMES) + 1, dtype=bool)
+        lookup[list(classes)] = True
+        return lookup
+
+    STRIDE = 32  # YOLOv8 input sizes must be multiples of the largest stride
+
+    def input_size(self, imgsz: Optional[int]) -> Optional[int]:
+        """Round a requested inference size up to a multiple of STRIDE."""
+        return None if imgsz is None else max(self.STRIDE, -(-int(imgsz) // self.STRIDE) * self.STRIDE)
+
+    def detect(self, frames: Sequence[np.ndarray], conf_threshold: float,
+               classes: Optional[Sequence[int]] = None, imgsz: Optional[int] = None) -> List[np.ndarray]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'device': self.device, 'precision': self.precision}
+
+    def head_classes(self) -> int:
+        return len(COCO_NAMES) if self.class_map is None else len(self.class_map)
+
+
+class TorchDetector(Detector):
+    """Ultralytics YOLO through PyTorch eager mode."""
+
+    name = "torch"
+
+    def __init__(self, weights: str = 'yolov8n.pt', device: Optional[str] = None, precision: str = 'fp32'):
+        import torch
+        from ultralytics import YOLO
+
+        self.device = device or ('cuda:0' if torch.cuda.is_available() else 'cpu')
+        if self.device.startswith('cuda'):
+            print(f"[CityWatch] GPU detected: {torch.cuda.get_device_name(0)}")
+        if precision != 'fp32' and not (precision == 'fp16' and self.device.startswith('cuda')):
+            print(f"[CityWatch] {precision} not supported by PyTorch on {self.device}, using fp32")
+            precision = 'fp32'
+        self.precision = precision
+        self.weights = weights
+        self.model = YOLO(weights)
+        self.model.to(self.device)
+        self.set_class_names(self.model.names)
+
+    def to_array(self, result) -> np.ndarray:
+        """Convert an Ultralytics result to an (N,6) float array with COCO class ids."""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return np.zeros((0, 6), dtype=np.float32)
+        detections = np.column_stack((
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy(),
+            boxes.cls.cpu().numpy()
+        )).astype(np.float32)
+        if self.class_map is not None:
+            detections[:, 5] = self.class_map[detections[:, 5].astype(np.int64)]
+            detections = detections[detections[:, 5] >= 0]
+        return detections
+
+    def detect(self, frames: Sequence[np.ndarray], conf_threshold: float,
+               classes: Optional[Sequence[int]] = None, imgsz: Optional[int] = None) -> List[np.ndarray]:
+        if classes is not None and self.class_map is not None:
+            # COCO ids -> this head's class indices
+            coco_ids = set(classes)
+            classes = [i for i, coco_id in enumerate(self.class_map.tolist()) if coco_id in coco_ids]
+        # Ultralytics drops other classes inside NMS
+        options = {} if imgsz is None else {'imgsz': self.input_size(imgsz)}
+        results = self.model(list(frames), conf=conf_threshold, verbose=False, device=self.device,
+                             half=self.precision == 'fp16', classes=None if classes is None else list(classes),
+                             **options)
+        return [self.to_array(result) for result in results]
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'device': self.device, 'precision': self.precision,
+                'model': self.weights, 'head_classes': self.head_classes()}
+
+
+class ExportedDetector(Detector):
+    """
+    Shared pre/post-processing for an exported YOLOv8 graph: letterbox to a
+    square input, one batched forward pass, then confidence filter, per-class
+    NMS and mapping boxes back to frame pixels. Subclasses provide _forward().
+    """
+
+    PAD_VALUE = 114
+    IOU_THRESHOLD = 0.7     # Same NMS defaults as Ultralytics predict
+    MAX_DETECTIONS = 300
+    CLASS_OFFSET = 7680     # Shifts boxes per class so one NMS call never mixes classes
+
+    def __init__(self, model_path: str, imgsz: int = 640, threads: Optional[int] = None,
+                 precision: str = 'fp32'):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.threads = threads
+        self.precision = precision
+        self.fixed_size: Optional[int] = None  # Set when the graph has a static input shape
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        """(B,3,S,S) float32 in [0,1] -> (B, 4 + classes, anchors) raw predictions."""
+        raise NotImplementedError
+
+    def _letterbox(self, frame: np.ndarray, size: int) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+        """Resize keeping aspect ratio and pad to size x size (centered, like Ultralytics)."""
+        h, w = frame.shape[:2]
+        gain = min(size / h, size / w)
+        new_w, new_h = int(round(w * gain)), int(round(h * gain))
+        if (new_w, new_h) != (w, h):
+            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+        top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+        bottom, right = size - new_h - top, size - new_w - left
+        frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                                   value=(self.PAD_VALUE,) * 3)
+        return frame, gain, (left, top)
+
+    def _preprocess(self, frames: Sequence[np.ndarray], imgsz: Optional[int] = None):
+        size = self.fixed_size or self.input_size(imgsz or self.imgsz)
+        padded, meta = [], []
+        for frame in frames:
+            image, gain, pad = self._letterbox(frame, size)
+            padded.append(image)
+            meta.append((gain, pad, frame.shape[:2]))
+        # BGR HWC uint8 -> RGB CHW float, one contiguous batch
+        batch = cv2.dnn.blobFromImages(padded, scalefactor=1 / 255.0, swapRB=True)
+        return batch, meta
+
+    def _postprocess(self, prediction: np.ndarray, conf_threshold: float, wanted: Optional[np.ndarray],
+                     gain: float, pad: Tuple[int, int], shape: Tuple[int, int]) -> np.ndarray:
+        """
+        Decode one image's (4 + classes, anchors) output to an (N,6) array in
+        frame pixels. `wanted` (see class_lookup) drops other classes before NMS.
+        """
+        scores = prediction[4:]
+        classes = scores.argmax(axis=0)
+        conf = scores[classes, np.arange(scores.shape[1])]
+        if self.class_map is not None:
+            classes = self.class_map[classes]
+        keep = conf > conf_threshold
+        if wanted is not None:
+            keep &= wanted[classes]
+        elif self.class_map is not None:
+            keep &= classes >= 0
+        if not keep.any():
+            return np.zeros((0, 6), dtype=np.float32)
+
+        cx, cy, w, h = prediction[:4, keep]
+        conf, classes = conf[keep], classes[keep]
+        offset = classes * self.CLASS_OFFSET
+        nms_boxes = np.column_stack((cx - w / 2 + offset, cy - h / 2 + offset, w, h))
+        idx = np.asarray(cv2.dnn.NMSBoxes(nms_boxes.tolist(), conf.tolist(), conf_threshold,
+                                          self.IOU_THRESHOLD, top_k=self.MAX_DETECTIONS)).reshape(-1)
+
+        cx, cy, w, h, conf, classes = cx[idx], cy[idx], w[idx], h[idx], conf[idx], classes[idx]
+        detections = np.column_stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2,
+                                      conf, classes)).astype(np.float32)
+        # Undo the letterbox and clip to the frame
+        detections[:, [0, 2]] = np.clip((detections[:, [0, 2]] - pad[0]) / gain, 0, shape[1])
+        detections[:, [1, 3]] = np.clip((detections[:, [1, 3]] - pad[1]) / gain, 0, shape[0])
+        return detections
+
+    def detect(self, frames: Sequence[np.ndarray], conf_threshold: float,
+               classes: Optional[Sequence[int]] = None, imgsz: Optional[int] = None) -> List[np.ndarray]:
+        if not frames:
+            return []
+        batch, meta = self._preprocess(frames, imgsz)
+        predictions = self._forward(batch)
+        wanted = self.class_lookup(classes)
+        return [self._postprocess(prediction, conf_threshold, wanted, *info)
+                for prediction, info in zip(predictions, meta)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'device': self.device, 'precision': self.precision,
+                'model': self.model_path, 'imgsz': self.fixed_size or self.imgsz, 'threads': self.threads,
+                'head_classes': self.head_classes()}
+
+
+class OnnxDetector(ExportedDetector):
+    """ONNX Runtime CPU session over an exported YOLOv8 model."""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, imgsz: int = 640, threads: Optional[int] = None,
+                 precision: str = 'fp32'):
+        import onnxruntime as ort
+
+        if precision == 'fp16':
+            # The CPU execution provider has no fast FP16 kernels
+            print("[CityWatch] fp16 not supported by ONNX Runtime on CPU, using fp32")
+            precision = 'fp32'
+        super().__init__(model_path, imgsz, threads, precision)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        if isinstance(model_input.shape[-1], int):
+            self.fixed_size = model_input.shape[-1]
+        names = self.session.get_modelmeta().custom_metadata_map.get('names')
+        self.set_class_names(ast.literal_eval(names) if names else None)
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoDetector(ExportedDetector):
+    """OpenVINO CPU plugin; reads the exported ONNX (or an OpenVINO IR .xml) directly."""
+
+    name = "openvino"
+
+    def __init__(self, model_path: str, imgsz: int = 640, threads: Optional[int] = None,
+                 precision: str = 'fp32'):
+        import openvino as ov
+
+        super().__init__(model_path, imgsz, threads, precision)
+        core = ov.Core()
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        if precision == 'fp16':
+            if 'FP16' not in core.get_property('CPU', 'OPTIMIZATION_CAPABILITIES'):
+                print("[CityWatch] CPU has no native fp16, using fp32")
+                self.precision = 'fp32'
+            else:
+                config['INFERENCE_PRECISION_HINT'] = 'f16'
+        elif precision == 'fp32':
+            # Keep newer CPUs from silently running bf16
+            config['INFERENCE_PRECISION_HINT'] = 'f32'
+        self.compiled = core.compile_model(core.read_model(model_path), 'CPU', config)
+        self.output = self.compiled.output(0)
+        width = self.compiled.input(0).get_partial_shape()[3]
+        if width.is_static:
+            self.fixed_size = width.get_length()
+        self.set_class_names(read_model_names(model_path))
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.compiled([batch])[self.output]
+
+
+def export_onnx(weights: str, imgsz: int = 640) -> str:
+    """
+    Export Ultralytics weights to ONNX next to the .pt file (once) with a
+    dynamic batch dimension, and return the .onnx path.
+    """
+    path = os.path.splitext(weights)[0] + '.onnx'
+    if not os.path.exists(path):
+        from ultralytics import YOLO
+        print(f"[CityWatch] Exporting {weights} to ONNX...")
+        path = YOLO(weights).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    return path
+
+
+def int8_model(weights: str, imgsz: int = 640) -> str:
+    """
+    Path of the INT8 model for `weights`. quantize.py calibrate writes a
+    statically quantized one; if none exists, a dynamically quantized model
+    is made (no calibration needed, usually slower and less accurate).
+    """
+    stem = os.path.splitext(weights)[0]
+    if stem.endswith('.int8'):
+        return weights
+    path = stem + '.int8.onnx'
+    if not os.path.exists(path):
+        from quantize import quantize_dynamic_model
+        print(f"[CityWatch] No calibrated {path}, quantizing dynamically "
+              f"(run quantize.py calibrate for a static INT8 model)...")
+        source = weights if weights.endswith('.onnx') else export_onnx(weights, imgsz)
+        quantize_dynamic_model(source, path)
+    return path
+
+
+BACKENDS = ('auto', 'torch', 'onnx', 'openvino')
+PRECISIONS = ('fp32', 'fp16', 'int8')
+RUNTIMES = {'onnx': 'onnxruntime', 'openvino': 'openvino'}
+
+
+def create_detector(backend: str = 'auto', weights: str = 'yolov8n.pt', imgsz: int = 640,
+                    threads: Optional[int] = None, device: Optional[str] = None,
+                    precision: str = 'fp32') -> Detector:
+    """
+    Build a detector. 'auto' keeps PyTorch when CUDA is available (and INT8
+    wasn't asked for) and otherwise prefers ONNX Runtime, then OpenVINO, on
+    CPU (OpenVINO first for fp16); a backend whose runtime isn't installed
+    falls back to PyTorch at fp32.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+
+    if backend == 'auto':
+        try:
+            import torch
+            gpu = torch.cuda.is_available() and device != 'cpu'
+        except ImportError:
+            gpu = False
+        if gpu and precision != 'int8':
+            candidates = ['torch']
+        elif precision == 'fp16':
+            candidates = ['openvino', 'onnx', 'torch']
+        else:
+            candidates = ['onnx', 'openvino', 'torch']
+    else:
+        candidates = [backend, 'torch'] if backend != 'torch' else ['torch']
+
+    for name in candidates:
+        if name == 'torch':
+            return TorchDetector(weights, device, precision)
+        # Only export once we know the runtime is installed
+        if importlib.util.find_spec(RUNTIMES[name]) is None:
+            if backend != 'auto':
+                print(f"[CityWatch] {RUNTIMES[name]} not installed, falling back to PyTorch")
+            continue
+        try:
+            if precision == 'int8':
+                model_path = int8_model(weights, imgsz)
+            elif weights.endswith(('.onnx', '.xml')):
+                model_path = weights
+            else:
+                model_path = export_onnx(weights, imgsz)
+            detector_cls = OnnxDetector if name == 'onnx' else OpenVinoDetector
+            return detector_cls(model_path, imgsz, threads, precision)
+        except Exception as e:
+            print(f"[CityWatch] {name} backend unavailable ({e}), falling back")
+    return TorchDetector(weights, device, precision)
@@ -0,0 +1,224 @@
+"""
+CityWatch - Threat Event Store
+Long-lived SQLite (WAL) log of threat events, indexed by time, camera, zone
+and type. record() only appends to memory; a background writer commits
+batches, so the video thread never waits on disk.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class EventStore:
+    """
+    Append-mostly event log with keyset-paginated range queries.
+    Events are returned newest first; pass the returned `next_cursor` back
+    to get the following page. Cost per page stays flat at millions of rows.
+    """
+
+    COLUMNS = ('id', 'ts', 'camera_id', 'zone', 'type', 'threat_level', 'confidence', 'persons', 'alert_id')
+    PRUNE_INTERVAL = 3600.0  # Seconds between retention sweeps
+
+    def __init__(self, path: str, flush_interval: float = 0.5, batch_size: int = 500,
+                 retention_days: Optional[float] = 30.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+
+        self._buffer = deque()
+        self._wake = threading.Event()
+        self._running = False
+        self._writer: Optional[threading.Thread] = None
+        self._last_prune = 0.0
+
+        # Schema is created up front so queries work before the writer starts
+        db = self._connect()
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                camera_id TEXT NOT NULL,
+                zone TEXT,
+                type TEXT NOT NULL,
+                threat_level INTEGER,
+                confidence REAL,
+                persons INTEGER,
+                alert_id INTEGER
+            )""")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON events (camera_id, ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_events_zone_ts ON events (zone, ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events (type, ts)")
+        db.close()
+
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+
+        # Counters for /pipeline_stats
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.write_failures = 0
+        self.pruned = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def record(self, camera_id: Hashable, event_type: str, ts: Optional[float] = None,
+               zone: Optional[str] = None, threat_level: Optional[int] = None,
+               confidence: Optional[float] = None, persons: Optional[int] = None,
+               alert_id: Optional[int] = None):
+        """Queue one event for the next batch write. Never blocks on disk."""
+        self._buffer.append((ts or time.time(), str(camera_id), zone, event_type, threat_level,
+                             None if confidence is None else round(float(confidence), 3), persons, alert_id))
+        self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def flush(self, db: Optional[sqlite3.Connection] = None) -> int:
+        """
+        Write everything buffered so far in one transaction. Returns rows written.
+        On failure the transaction is rolled back, the rows go back to the
+        front of the buffer for the next flush and the error is re-raised.
+        """
+        rows = []
+        while self._buffer:
+            rows.append(self._buffer.popleft())
+        if not rows:
+            return 0
+        own = db is None
+        db = db or self._connect()
+        try:
+            db.execute("BEGIN")
+            db.executemany("INSERT INTO events (ts, camera_id, zone, type, threat_level, confidence, persons, "
+                           "alert_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            self._buffer.extendleft(reversed(rows))
+            self.write_failures += 1
+            raise
+        finally:
+            if own:
+                db.close()
+        self.written += len(rows)
+        self.batches += 1
+        return len(rows)
+
+    def _prune(self, db: sqlite3.Connection):
+        """Drop events older than the retention period."""
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        self.pruned += db.execute("DELETE FROM events WHERE ts < ?", (cutoff,)).rowcount
+
+    def _write_loop(self):
+        db = self._connect()
+        try:
+            while self._running:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                try:
+                    self.flush(db)
+                    if time.time() - self._last_prune > self.PRUNE_INTERVAL:
+                        self._last_prune = time.time()
+                        self._prune(db)
+                except sqlite3.Error as e:
+                    print(f"[EVENTS] Write failed: {e}")
+            try:
+                self.flush(db)
+            except sqlite3.Error as e:
+                print(f"[EVENTS] Final write failed, {len(self._buffer)} event(s) not saved: {e}")
+        finally:
+            db.close()
+
+    def start(self):
+        """Start the background batch writer."""
+        if self._running:
+            return
+        self._running = True
+        self._writer = threading.Thread(target=self._write_loop, name="event-store-writer", daemon=True)
+        self._writer.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Stop the writer after a final flush."""
+        self._running = False
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join(timeout)
+
+    @staticmethod
+    def _filters(start: Optional[float], end: Optional[float], camera_id: Optional[Hashable],
+                 zone: Optional[str], event_type: Optional[str]) -> Tuple[List[str], List[Any]]:
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(end)
+        if camera_id is not None:
+            clauses.append("camera_id = ?")
+            params.append(str(camera_id))
+        if zone is not None:
+            clauses.append("zone = ?")
+            params.append(zone)
+        if event_type is not None:
+            clauses.append("type = ?")
+            params.append(event_type)
+        return clauses, params
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              camera_id: Optional[Hashable] = None, zone: Optional[str] = None,
+              event_type: Optional[str] = None, limit: int = 100,
+              cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Events in [start, end), newest first, optionally filtered by camera,
+        zone and type. Returns {'events': [...], 'next_cursor': str or None}.
+        """
+        clauses, params = self._filters(start, end, camera_id, zone, event_type)
+        if cursor:
+            # Keyset pagination: continue strictly after the last (ts, id) returned
+            cursor_ts, cursor_id = cursor.split(':')
+            clauses.append("(ts < ? OR (ts = ? AND id < ?))")
+            params += [float(cursor_ts), float(cursor_ts), int(cursor_id)]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM events {where} ORDER BY ts DESC, id DESC LIMIT ?"
+        with self._read_lock:
+            rows = self._reader.execute(sql, params + [limit + 1]).fetchall()
+
+        events = [dict(zip(self.COLUMNS, row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = events[-1]
+            next_cursor = f"{last['ts']!r}:{last['id']}"
+        return {'events': events, 'next_cursor': next_cursor}
+
+    def counts(self, start: Optional[float] = None, end: Optional[float] = None,
+               camera_id: Optional[Hashable] = None, zone: Optional[str] = None) -> Dict[str, int]:
+        """Number of events per type in the range."""
+        clauses, params = self._filters(start, end, camera_id, zone, None)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._read_lock:
+            rows = self._reader.execute(f"SELECT type, COUNT(*) FROM events {where} GROUP BY type",
+                                        params).fetchall()
+        return dict(rows)
+
+    def stats(self) -> Dict[str, int]:
+        """Buffered rows and lifetime write counters."""
+        return {
+            'buffered': len(self._buffer),
+            'recorded': self.recorded,
+            'written': self.written,
+            'batches': self.batches,
+            'write_failures': self.write_failures,
+            'pruned': self.pruned
+        }
@@ -9,12 +9,298 @@ This version uses YOLO for all detection with simulated pose analysis.
 
 import cv2
 import numpy as np
-import torch
-from ultralytics import YOLO
 from collections import deque
-from typing import Dict, Tuple, Any
+from typing import Dict, Tuple, Any, List, Hashable, Optional, Sequence
 import time
 
+from detectors import create_detector
+from timeseries import ThreatTimeSeries
+
+
+def _box_overlap(boxes_a: np.ndarray, boxes_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pairwise intersection areas (N,M) plus the areas of both box sets, broadcastable to (N,M)."""
+    a = boxes_a[:, None, :4]
+    b = boxes_b[None, :, :4]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter_w * inter_h, area_a, area_b
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N,4+) and (M,4+) xyxy box arrays. Returns (N,M)."""
+    inter, area_a, area_b = _box_overlap(boxes_a, boxes_b)
+    union = area_a + area_b - inter
+    return np.divide(inter, union, out=np.zeros_like(inter, dtype=np.float32), where=union > 0)
+
+
+def merge_overlapping(detections: np.ndarray, iou_threshold: float = 0.5,
+                      ios_threshold: float = 0.7) -> np.ndarray:
+    """
+    Cross-tile NMS over an (N,6) array: greedy by confidence, a box is dropped
+    if a kept box of the same class overlaps it by IoU > iou_threshold or
+    covers it by intersection-over-smaller > ios_threshold (an object cut at a
+    tile edge shows up as a box inside the full one).
+    """
+    if len(detections) < 2:
+        return detections
+    detections = detections[np.argsort(-detections[:, 4])]
+    inter, area_a, area_b = _box_overlap(detections, detections)
+    union = area_a + area_b - inter
+    smaller = np.minimum(area_a, area_b)
+    iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+    ios = np.divide(inter, smaller, out=np.zeros_like(inter), where=smaller > 0)
+    same_class = detections[:, None, 5] == detections[None, :, 5]
+    overlaps = same_class & ((iou > iou_threshold) | (ios > ios_threshold))
+    
+    keep = np.ones(len(detections), dtype=bool)
+    for i in range(len(detections)):
+        if keep[i]:
+            keep[i + 1:] &= ~overlaps[i, i + 1:]
+    return detections[keep]
+
+
+def fall_mask(person_boxes: np.ndarray, frame_height: int,
+              aspect_threshold: float = 1.3, height_band: float = 0.65) -> np.ndarray:
+    """
+    Single-frame fall test over an (N,4+) person box array.
+    Fall = wider than `aspect_threshold` x height AND centre below
+    `height_band` of the frame height. Returns an (N,) boolean mask.
+    """
+    widths = person_boxes[:, 2] - person_boxes[:, 0]
+    heights = person_boxes[:, 3] - person_boxes[:, 1]
+    center_y = (person_boxes[:, 1] + person_boxes[:, 3]) / 2
+    return (heights > 0) & (widths > aspect_threshold * heights) & (center_y > frame_height * height_band)
+
+
+class PersonTracker:
+    """
+    Lightweight multi-person tracker: greedy IoU association on NumPy arrays.
+    Assigns stable IDs and keeps fall/SOS counters per track, so people in
+    a crowd no longer share one global counter.
+    """
+    
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 10):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed  # Frames a track survives without a match
+        self.next_id = 1
+        
+        # One row per track
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.missed = np.zeros(0, dtype=np.int32)
+        self.fall_hits = np.zeros(0, dtype=np.int32)  # Consecutive horizontal frames
+        self.sos_count = np.zeros(0, dtype=np.int32)  # Raised-arms counter
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def _match(self, detections: np.ndarray) -> np.ndarray:
+        """Greedy highest-IoU-first matching. Returns track slot per detection (-1 = new)."""
+        slots = np.full(len(detections), -1, dtype=np.int64)
+        if len(detections) == 0 or len(self.boxes) == 0:
+            return slots
+        
+        iou = box_iou(detections, self.boxes)
+        det_idx, trk_idx = np.nonzero(iou >= self.iou_threshold)
+        order = np.argsort(-iou[det_idx, trk_idx], kind='stable')
+        
+        used_tracks = set()
+        for det, trk in zip(det_idx[order].tolist(), trk_idx[order].tolist()):
+            if slots[det] < 0 and trk not in used_tracks:
+                slots[det] = trk
+                used_tracks.add(trk)
+        return slots
+    
+    def update(self, detections: np.ndarray) -> np.ndarray:
+        """
+        Associate this frame's (N,4+) person boxes with existing tracks.
+        Returns the track slot (row in the track arrays) of every detection.
+        """
+        slots = self._match(detections)
+        
+        # Matched tracks take the new box; unmatched tracks age
+        seen = np.zeros(len(self.ids), dtype=bool)
+        seen[slots[slots >= 0]] = True
+        self.boxes[slots[slots >= 0]] = detections[slots >= 0, :4]
+        self.missed = np.where(seen, 0, self.missed + 1).astype(np.int32)
+        
+        # Unmatched detections start new tracks
+        new = np.flatnonzero(slots < 0)
+        if len(new):
+            slots[new] = np.arange(len(self.ids), len(self.ids) + len(new))
+            self.boxes = np.vstack((self.boxes, detections[new, :4].astype(np.float32)))
+            self.ids = np.concatenate((self.ids, np.arange(self.next_id, self.next_id + len(new))))
+            self.missed = np.concatenate((self.missed, np.zeros(len(new), dtype=np.int32)))
+            self.fall_hits = np.concatenate((self.fall_hits, np.zeros(len(new), dtype=np.int32)))
+            self.sos_count = np.concatenate((self.sos_count, np.zeros(len(new), dtype=np.int32)))
+            self.next_id += len(new)
+        
+        # Drop tracks that have been gone too long and remap slots
+        keep = self.missed <= self.max_missed
+        if not keep.all():
+            remap = np.cumsum(keep) - 1
+            slots = remap[slots]
+            self.boxes = self.boxes[keep]
+            self.ids = self.ids[keep]
+            self.missed = self.missed[keep]
+            self.fall_hits = self.fall_hits[keep]
+            self.sos_count = self.sos_count[keep]
+        return slots
+
+
+class DetectionResult:
+    """
+    Compact, array-backed detections for one frame (no per-detection dicts).
+    `detections` is the (N,6) detector output (x1, y1, x2, y2, conf, cls);
+    `boxes` and `confidences` are views into it. Per-row masks mark weapons,
+    persons, confirmed falls and SOS; `track_ids` is -1 for non-persons.
+    """
+    __slots__ = ('camera_id', 'timestamp', 'detections', 'classes', 'track_ids',
+                 'weapon_mask', 'person_mask', 'fall_mask', 'sos_mask',
+                 'sos_progress', 'threat_level', 'inference_ms', 'detector_ran')
+    
+    def __init__(self, camera_id: Hashable, timestamp: float, detections: np.ndarray,
+                 classes: np.ndarray, track_ids: np.ndarray, weapon_mask: np.ndarray,
+                 person_mask: np.ndarray, fall_mask: np.ndarray, sos_mask: np.ndarray,
+                 sos_progress: int, threat_level: int, inference_ms: float,
+                 detector_ran: bool):
+        self.camera_id = camera_id
+        self.timestamp = timestamp        # Capture time (epoch seconds)
+        self.detections = detections
+        self.classes = classes
+        self.track_ids = track_ids
+        self.weapon_mask = weapon_mask
+        self.person_mask = person_mask
+        self.fall_mask = fall_mask
+        self.sos_mask = sos_mask
+        self.sos_progress = sos_progress  # Closest-to-SOS person, 0..SOS_THRESHOLD
+        self.threat_level = threat_level
+        self.inference_ms = inference_ms  # Forward pass that produced these boxes (0 if carried over)
+        self.detector_ran = detector_ran  # False when boxes were carried over from an earlier frame
+    
+    def __len__(self) -> int:
+        return len(self.detections)
+    
+    @property
+    def boxes(self) -> np.ndarray:
+        return self.detections[:, :4]
+    
+    @property
+    def confidences(self) -> np.ndarray:
+        return self.detections[:, 4]
+    
+    @property
+    def weapon_detected(self) -> bool:
+        return bool(self.weapon_mask.any())
+    
+    @property
+    def fall_detected(self) -> bool:
+        return bool(self.fall_mask.any())
+    
+    @property
+    def sos_detected(self) -> bool:
+        return bool(self.sos_mask.any())
+    
+    def status(self) -> Dict[str, Any]:
+        """The legacy process_frame status dict."""
+        return {
+            'weapon_detected': self.weapon_detected,
+            'fall_detected': self.fall_detected,
+            'sos_detected': self.sos_detected,
+            'threat_level': self.threat_level
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Columnar JSON-friendly form for export/history."""
+        return {
+            'camera_id': self.camera_id,
+            'timestamp': self.timestamp,
+            'boxes': self.boxes.astype(np.float64).round(1).tolist(),
+            'classes': self.classes.tolist(),
+            'confidences': self.confidences.astype(np.float64).round(3).tolist(),
+            'track_ids': self.track_ids.tolist(),
+            'weapon': self.weapon_mask.tolist(),
+            'fall': self.fall_mask.tolist(),
+            'sos': self.sos_mask.tolist(),
+            'threat_level': self.threat_level,
+            'inference_ms': round(self.inference_ms, 2),
+            'detector_ran': self.detector_ran
+        }
+
+
+class AnnotatedFrame:
+    """
+    A captured frame plus its DetectionResult.
+    Annotations are drawn onto a copy lazily, at most once, the first time
+    someone (viewer, snapshot, alert, clip) asks for pixels. Alert-only
+    nodes never pay for the copy or the drawing.
+    """
+    __slots__ = ('frame', 'result', '_renderer', '_image')
+    
+    def __init__(self, frame: np.ndarray, result: DetectionResult, renderer):
+        self.frame = frame
+        self.result = result
+        self._renderer = renderer
+        self._image = None
+    
+    @property
+    def rendered(self) -> bool:
+        return self._image is not None
+    
+    def image(self) -> np.ndarray:
+        """Annotated copy of the frame, drawn on first use."""
+        if self._image is None:
+            self._image = self._renderer(self.frame, self.result)
+        return self._image
+    
+    def overlay(self):
+        """
+        Drawer for this result onto another copy of the frame (e.g. decoded
+        from the clip buffer). Holds the result only, not the pixels.
+        """
+        renderer, result = self._renderer, self.result
+        return lambda frame: renderer(frame, result)
+
+
+class CameraState:
+    """
+    Per-camera detection state.
+    Fall/SOS counters live on per-person tracks so several cameras can share one engine.
+    """
+    
+    def __init__(self, camera_id: Hashable):
+        self.camera_id = camera_id
+        self.tracker = PersonTracker()
+        self.last_track_ids = np.zeros(0, dtype=np.int64)
+        self.frames_processed = 0
+        
+        # Adaptive scheduler: last detections (N,6) are carried over skipped frames
+        self.last_detections = None
+        self.last_analysis = None  # (track_ids, fall_mask, sos_mask, sos_progress) of last_detections
+        self.frames_since_detect = 0
+        self.active_until = 0  # Run every frame until this frame count
+        
+        # Motion gate: downscaled gray frame at the last inference
+        self.motion_ref = None
+        self.motion_small = None
+        self.motion_box = None  # (x1, y1, x2, y2) of moved pixels, full-res
+        
+        # Inference options (see CityWatchEngine.configure_camera)
+        self.imgsz: Optional[int] = None          # Detector input size (None = detector default)
+        self.tiles: Optional[Tuple[int, int]] = None  # (cols, rows) overlapping tiles per frame
+        self.tile_overlap = 0.2
+        self.roi: Optional[List[np.ndarray]] = None  # Polygons in 0..1 frame coordinates
+        self.roi_cache = None  # (frame shape, full-res mask, bounding box, motion-size mask)
+        self.threat_last_seen: Dict[str, float] = {}  # Threat type -> last capture time seen
+        self.status = {
+            'weapon_detected': False,
+            'fall_detected': False,
+            'sos_detected': False,
+            'threat_level': 0
+        }
+
 
 class CityWatchEngine:
     """
@@ -37,6 +323,10 @@ class CityWatchEngine:
     
     # All detectable objects for demo (NO cell phone)
     WEAPON_CLASSES = {KNIFE_CLASS, SCISSORS_CLASS, BOTTLE_CLASS, FORK_CLASS, REMOTE_CLASS, TOOTHBRUSH_CLASS}
+    WEAPON_CLASS_IDS = np.array(sorted(WEAPON_CLASSES), dtype=np.int32)  # For array masks
+    
+    # Only these classes are decoded by the detector (filtered before NMS)
+    TRACKED_CLASSES = sorted(WEAPON_CLASSES | {PERSON_CLASS})
     
     # Colors (BGR format for OpenCV)
     COLOR_RED = (0, 0, 255)       # Weapon detection
@@ -46,167 +336,336 @@ class CityWatchEngine:
     COLOR_WHITE = (255, 255, 255)
     COLOR_CYAN = (255, 255, 0)    # Info
     
-    def __init__(self, source: int = 0):
+    # Fall detection tuning
+    FALL_ASPECT_THRESHOLD = 1.3   # Width/height ratio of a lying person
+    FALL_HEIGHT_BAND = 0.65       # Box centre must be below this fraction of frame height
+    FALL_CONFIRM_FRAMES = 3       # Consecutive horizontal frames before a fall fires
+    
+    # Motion gate tuning (frame differencing on a 160x120 gray thumbnail)
+    MOTION_SIZE = (160, 120)
+    MOTION_PIXEL_DELTA = 25       # Gray-level change that counts as motion
+    MOTION_MIN_AREA = 0.002       # Fraction of thumbnail pixels that must change
+    MOTION_REFRESH_FRAMES = 150   # Force a detection this often even if static
+    MOTION_CROP_MARGIN = 0.1      # Padding around the moved region (fraction of frame)
+    MOTION_CROP_MAX_AREA = 0.5    # Bigger moved regions run on the full frame
+    
+    # A threat type must be clear this long on a camera before it counts as a new incident
+    THREAT_REARM_SECONDS = 5.0
+    
+    # Tiled inference: tiles are merged with cross-tile NMS; the whole region
+    # also runs once (downscaled) so large near-field objects aren't split
+    TILE_FULL_FRAME = True
+    TILE_IOU = 0.5
+    TILE_IOS = 0.7
+    
+    def __init__(self, source: int = 0, idle_detect_interval: int = 3,
+                 active_hold_frames: int = 30, motion_gate: bool = True,
+                 motion_crop: bool = False, telemetry=None, backend: str = 'auto',
+                 weights: str = 'yolov8n.pt', threads: Optional[int] = None,
+                 device: Optional[str] = None, precision: str = 'fp32',
+                 class_filter: bool = True):
         """
         Initialize the CityWatch detection engine.
+        idle_detect_interval: run YOLO every Nth frame while a camera is idle (1 = every frame)
+        active_hold_frames: keep detecting every frame this long after a person/weapon was seen
+        motion_gate: skip YOLO entirely while nothing moved since the last inference
+        motion_crop: run YOLO only on the region that moved
+        telemetry: optional telemetry.Telemetry receiving inference/postprocess/draw timings
+        backend: detector runtime - 'auto', 'torch', 'onnx' or 'openvino' (see detectors.py)
+        weights: YOLOv8 weights (.pt, or an exported .onnx / OpenVINO .xml)
+        threads: intra-op CPU threads for the ONNX Runtime / OpenVINO backends (None = all cores)
+        device: force 'cpu' or 'cuda:0' (default: CUDA when available)
+        precision: 'fp32', 'fp16' (CUDA / OpenVINO) or 'int8' (ONNX Runtime / OpenVINO)
+        class_filter: have the detector keep only TRACKED_CLASSES (False = all 80 COCO classes)
         """
         self.source = source
         
-        # Check GPU availability and set device
-        self.device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
-        print(f"[CityWatch] Initializing on device: {self.device}")
-        
-        if self.device == 'cuda:0':
-            gpu_name = torch.cuda.get_device_name(0)
-            print(f"[CityWatch] GPU detected: {gpu_name}")
-        
-        # Initialize YOLOv8 nano model for fast inference
-        print("[CityWatch] Loading YOLOv8n model...")
-        self.yolo_model = YOLO('yolov8n.pt')
-        self.yolo_model.to(self.device)
+        # Initialize YOLOv8 nano model on the fastest runtime available
+        print(f"[CityWatch] Loading {weights} (backend: {backend}, precision: {precision})...")
+        self.detector = create_detector(backend, weights, threads=threads, device=device, precision=precision)
+        self.device = self.detector.device
+        print(f"[CityWatch] Detector: {self.detector.name} {self.detector.precision} on {self.device}")
+        self.detect_classes = self.TRACKED_CLASSES if class_filter else None
         
         # Pose detection simulation (using person bounding boxes)
         print("[CityWatch] Initializing Pose Analyzer (YOLO-based)...")
         self.prev_person_boxes = []
-        self.person_history = deque(maxlen=30)  # Track person positions
         
         # SOS detection: track raised hands pattern
         self.sos_frame_count = 0
         self.SOS_THRESHOLD = 15  # Frames needed for SOS
-        self.hand_raise_count = 0
         
-        # Fall detection state
-        self.prev_aspect_ratios = deque(maxlen=10)
+        # Per-camera fall/SOS state, keyed by camera id
+        self.cameras: Dict[Hashable, CameraState] = {}
+        
+        # Adaptive inference scheduler
+        self.idle_detect_interval = max(1, idle_detect_interval)
+        self.active_hold_frames = active_hold_frames
+        self.detections_run = 0
+        self.detect_window = deque(maxlen=100)  # 1 = detector ran, 0 = skipped
+        self.frames_rendered = 0  # Frames annotated on demand (headless frames cost nothing)
+        
+        # Wall time (ms) of each stage for the most recent frame
+        self.stage_ms: Dict[str, float] = {'inference': 0.0, 'tracking': 0.0, 'fall': 0.0,
+                                           'sos': 0.0, 'postprocess': 0.0, 'draw': 0.0}
+        self.telemetry = telemetry
+        
+        # Motion-gated inference
+        self.motion_gate = motion_gate
+        self.motion_crop = motion_crop
+        self.motion_skips = 0
+        self.detector_inputs = 0  # Images (frames, crops, tiles) sent to the detector
         
         # === CHAMPIONSHIP FEATURES: Analytics & History ===
-        self.threat_history = deque(maxlen=60)
+        self.threat_series = ThreatTimeSeries()  # Threat level per tick with 1s/1m/1h rollups
         self.frames_processed = 0
         self.threats_detected_today = 0
+        self.threats_day = time.strftime('%Y-%m-%d')
+        self.response_times = deque(maxlen=100)  # Capture -> detection (s) of recent new threats
         self.start_time = None
         self.status_flags = {'weapon_detected': False, 'fall_detected': False, 'sos_detected': False}
         
         print("[CityWatch] Engine initialized successfully!")
     
-    def _detect_weapons_and_persons(self, frame: np.ndarray, conf_threshold: float) -> Tuple[np.ndarray, bool, list, list]:
+    def configure_camera(self, camera_id: Hashable, imgsz: Optional[int] = None,
+                         tiles: Optional[Sequence[int]] = None, tile_overlap: float = 0.2,
+                         roi: Optional[Sequence[Sequence[Sequence[float]]]] = None):
         """
-        Detect weapons and persons using YOLOv8.
+        Per-camera inference options.
+        imgsz: detector input size for this camera (e.g. 1280 for distant objects, 320 for near-field)
+        tiles: (cols, rows) overlapping tiles run in the same batch and merged with cross-tile NMS
+        tile_overlap: fraction of a tile shared with its neighbour
+        roi: polygons [[x, y], ...] in 0..1 frame coordinates; pixels outside them are never
+             sent to the detector and boxes centred outside are dropped
         """
-        weapon_detected = False
-        detections = []
-        person_boxes = []
+        cam = self.get_camera_state(camera_id)
+        cam.imgsz = imgsz
+        cam.tiles = tuple(tiles) if tiles and tuple(tiles) != (1, 1) else None
+        cam.tile_overlap = tile_overlap
+        cam.roi = [np.asarray(polygon, dtype=np.float32).reshape(-1, 2) for polygon in roi] if roi else None
+        cam.roi_cache = None
+    
+    def get_camera_state(self, camera_id: Hashable = 0) -> CameraState:
+        """Get (or lazily create) the detection state for one camera."""
+        cam = self.cameras.get(camera_id)
+        if cam is None:
+            cam = CameraState(camera_id)
+            self.cameras[camera_id] = cam
+        return cam
+    
+    def _detect_motion(self, cam: CameraState, frame: np.ndarray) -> bool:
+        """
+        Cheap frame differencing against the thumbnail from the last inference.
+        Stores the moved region in cam.motion_box. Returns True if anything moved.
+        """
+        small = cv2.cvtColor(cv2.resize(frame, self.MOTION_SIZE, interpolation=cv2.INTER_AREA),
+                             cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+        cam.motion_small = small
+        cam.motion_box = None
         
-        # Run YOLO inference
-        results = self.yolo_model(
-            frame, 
-            conf=conf_threshold, 
-            verbose=False,
-            device=self.device
-        )
+        if cam.motion_ref is None:
+            return True
         
-        for result in results:
-            boxes = result.boxes
-            if boxes is None:
-                continue
-                
-            for box in boxes:
-                cls_id = int(box.cls[0])
-                conf = float(box.conf[0])
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                
-                class_name = self.yolo_model.names[cls_id]
-                
-                detection_info = {
-                    'class_id': cls_id,
-                    'class_name': class_name,
-                    'confidence': conf,
-                    'bbox': (x1, y1, x2, y2)
-                }
-                detections.append(detection_info)
-                
-                # Check if it's a weapon
-                if cls_id in self.WEAPON_CLASSES:
-                    weapon_detected = True
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), self.COLOR_RED, 3)
-                    # Generic label - don't show actual object name
-                    cv2.putText(frame, "THREAT DETECTED", (x1, y1 - 10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, self.COLOR_RED, 2)
-                    cv2.putText(frame, "! WEAPON DETECTED !", (10, 30),
-                               cv2.FONT_HERSHEY_SIMPLEX, 1.0, self.COLOR_RED, 3)
-                               
-                elif cls_id == self.PERSON_CLASS:
-                    person_boxes.append((x1, y1, x2, y2, conf))
-                    # NOTE: Person box drawing moved to process_frame for consolidated rendering
-        
-        return frame, weapon_detected, detections, person_boxes
-    
-    def _detect_fall(self, frame: np.ndarray, person_boxes: list) -> Tuple[np.ndarray, bool, list]:
+        mask = cv2.absdiff(small, cam.motion_ref) > self.MOTION_PIXEL_DELTA
+        roi_small = self._roi(cam, frame.shape)[2]
+        if roi_small is not None:
+            mask &= roi_small  # Movement outside the ROI never wakes the detector
+        if mask.mean() < self.MOTION_MIN_AREA:
+            return False
+        
+        # Bounding box of the moved pixels, scaled back to full resolution
+        ys, xs = np.nonzero(mask)
+        sx = frame.shape[1] / self.MOTION_SIZE[0]
+        sy = frame.shape[0] / self.MOTION_SIZE[1]
+        cam.motion_box = (int(xs.min() * sx), int(ys.min() * sy),
+                          int((xs.max() + 1) * sx), int((ys.max() + 1) * sy))
+        return True
+    
+    def _confirmation_pending(self, cam: CameraState) -> bool:
+        """True while a track is part-way to a fall or SOS confirmation."""
+        tracker = cam.tracker
+        return bool(((tracker.fall_hits > 0) & (tracker.fall_hits < self.FALL_CONFIRM_FRAMES)).any()
+                    or (tracker.sos_count > 0).any())
+    
+    def _is_active(self, cam: CameraState) -> bool:
+        """Someone was seen recently, or a fall/SOS confirmation is pending."""
+        return cam.frames_processed < cam.active_until or self._confirmation_pending(cam)
+    
+    def _should_detect(self, cam: CameraState, frame: np.ndarray) -> bool:
         """
-        Detect falls using person bounding box aspect ratio.
-        Fall = horizontal orientation (width > height significantly)
-        Returns: frame, fall_detected, list of falling person indices
+        Active camera (person/weapon seen within active_hold_frames, or a
+        fall/SOS streak pending): every frame, moving or not.
+        Idle camera: motion gate first (no motion since the last inference
+        means no YOLO), then every `idle_detect_interval`-th frame.
         """
-        fall_detected = False
-        fall_indices = []
-        frame_height = frame.shape[0]
+        # Motion is measured on every frame so the reference stays current
+        moved = self._detect_motion(cam, frame) if self.motion_gate else True
+        if cam.last_detections is None or self._is_active(cam):
+            return True
         
-        for idx, box in enumerate(person_boxes):
-            x1, y1, x2, y2 = box[:4]  # Handle both 4-tuple and 5-tuple
-            width = x2 - x1
-            height = y2 - y1
-            
-            if height > 0:
-                aspect_ratio = width / height
-                self.prev_aspect_ratios.append(aspect_ratio)
-                
-                # Fall detection: horizontal orientation AND low in frame
-                center_y = (y1 + y2) / 2
-                is_horizontal = aspect_ratio > 1.3
-                is_low_in_frame = center_y > frame_height * 0.65
-                
-                if is_horizontal and is_low_in_frame:
-                    fall_detected = True
-                    fall_indices.append(idx)
-                    cv2.putText(frame, "! FALL DETECTED !", (10, 70),
-                               cv2.FONT_HERSHEY_SIMPLEX, 1.0, self.COLOR_YELLOW, 3)
+        if not moved and cam.frames_since_detect + 1 < self.MOTION_REFRESH_FRAMES:
+            self.motion_skips += 1
+            return False
+        if self.idle_detect_interval <= 1:
+            return True
+        return cam.frames_since_detect + 1 >= self.idle_detect_interval
+    
+    def _crop_region(self, cam: CameraState, frame: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """Padded crop around the moved region, or None to run on the full frame."""
+        if not self.motion_crop or cam.motion_box is None or cam.last_detections is None:
+            return None
+        
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = cam.motion_box
+        pad_x, pad_y = int(w * self.MOTION_CROP_MARGIN), int(h * self.MOTION_CROP_MARGIN)
+        x1, y1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+        x2, y2 = min(w, x2 + pad_x), min(h, y2 + pad_y)
         
-        return frame, fall_detected, fall_indices
+        if (x2 - x1) * (y2 - y1) > self.MOTION_CROP_MAX_AREA * w * h:
+            return None
+        return x1, y1, x2, y2
+    
+    def _roi(self, cam: CameraState, shape: Tuple[int, ...]):
+        """(full-res mask, bounding box, motion-size mask) of the camera's ROI at this frame size, or Nones."""
+        if cam.roi is None:
+            return None, None, None
+        if cam.roi_cache is None or cam.roi_cache[0] != shape[:2]:
+            h, w = shape[:2]
+            polygons = [np.round(polygon * (w, h)).astype(np.int32) for polygon in cam.roi]
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(mask, polygons, 255)
+            x, y, box_w, box_h = cv2.boundingRect(np.vstack(polygons))
+            box = (max(0, x), max(0, y), min(w, x + box_w), min(h, y + box_h))
+            small = cv2.resize(mask, self.MOTION_SIZE, interpolation=cv2.INTER_NEAREST) > 0
+            cam.roi_cache = (shape[:2], mask, box, small)
+        return cam.roi_cache[1:]
     
-    def _detect_sos(self, frame: np.ndarray, person_boxes: list) -> Tuple[np.ndarray, bool]:
+    @staticmethod
+    def _tile_boxes(width: int, height: int, grid: Tuple[int, int],
+                    overlap: float) -> List[Tuple[int, int, int, int]]:
+        """(x1, y1, x2, y2) of cols x rows equal tiles covering width x height, neighbours overlapping."""
+        def spans(length: int, count: int) -> List[Tuple[int, int]]:
+            size = min(length, int(np.ceil(length / (count - (count - 1) * overlap))))
+            starts = np.linspace(0, length - size, count).round().astype(int) if count > 1 else [0]
+            return [(int(start), int(start) + size) for start in starts]
+        cols, rows = grid
+        return [(x1, y1, x2, y2) for y1, y2 in spans(height, rows) for x1, x2 in spans(width, cols)]
+    
+    def _plan_inference(self, cam: CameraState, frame: np.ndarray):
         """
-        Detect SOS signal - person with arms raised (simulated).
-        Uses upper body detection in person box.
+        What the detector sees for one camera: the scanned region (x1, y1, x2, y2),
+        whether it is a partial (motion crop) re-scan, and the input images with
+        their (x, y) offset in the frame. Pixels outside the ROI are blacked out
+        and cropped away; tiled cameras get overlapping tiles plus the whole region.
         """
-        sos_detected = False
+        h, w = frame.shape[:2]
+        roi_mask, roi_box, _ = self._roi(cam, frame.shape)
+        region, partial = roi_box or (0, 0, w, h), False
+        crop = self._crop_region(cam, frame)
+        if crop is not None:
+            x1, y1 = max(crop[0], region[0]), max(crop[1], region[1])
+            x2, y2 = min(crop[2], region[2]), min(crop[3], region[3])
+            if x2 > x1 and y2 > y1:
+                region, partial = (x1, y1, x2, y2), True
         
-        for box in person_boxes:
-            x1, y1, x2, y2 = box[:4]  # Handle both 4-tuple and 5-tuple
-            height = y2 - y1
-            width = x2 - x1
-            
-            # Check for "T-pose" like configuration (arms extended)
-            # Simulated: if person box is wide relative to height
-            if width > height * 0.8 and height > 50:
-                self.hand_raise_count += 1
-            else:
-                self.hand_raise_count = max(0, self.hand_raise_count - 1)
-            
-            # Show progress
-            if self.hand_raise_count > 0:
-                progress = min(self.hand_raise_count, self.SOS_THRESHOLD)
-                cv2.putText(frame, f"SOS Signal: {progress}/{self.SOS_THRESHOLD}",
-                           (10, frame.shape[0] - 20),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, self.COLOR_BLUE, 2)
-            
-            if self.hand_raise_count >= self.SOS_THRESHOLD:
-                sos_detected = True
-                cv2.putText(frame, "! SOS RECEIVED !", (10, 110),
-                           cv2.FONT_HERSHEY_SIMPLEX, 1.2, self.COLOR_BLUE, 3)
-                break
+        x1, y1, x2, y2 = region
+        image = frame[y1:y2, x1:x2]
+        if roi_mask is not None:
+            image = cv2.bitwise_and(image, image, mask=roi_mask[y1:y2, x1:x2])
+        if cam.tiles is None or partial:
+            return region, partial, [(x1, y1, image)]
+        
+        inputs = [(x1, y1, image)] if self.TILE_FULL_FRAME else []
+        for tx1, ty1, tx2, ty2 in self._tile_boxes(x2 - x1, y2 - y1, cam.tiles, cam.tile_overlap):
+            inputs.append((x1 + tx1, y1 + ty1, image[ty1:ty2, tx1:tx2]))
+        return region, partial, inputs
+    
+    def _merge_inputs(self, cam: CameraState, frame: np.ndarray, inputs: list,
+                      results: List[np.ndarray]) -> np.ndarray:
+        """Shift per-input boxes into frame coordinates, merge tiles and drop boxes centred outside the ROI."""
+        parts = []
+        for (x, y, _), detections in zip(inputs, results):
+            if x or y:
+                detections = detections.copy()
+                detections[:, [0, 2]] += x
+                detections[:, [1, 3]] += y
+            parts.append(detections)
+        if len(parts) == 1:
+            detections = parts[0]
+        else:
+            detections = merge_overlapping(np.vstack(parts), self.TILE_IOU, self.TILE_IOS)
+        
+        roi_mask = self._roi(cam, frame.shape)[0]
+        if roi_mask is not None and len(detections):
+            h, w = roi_mask.shape
+            cx = ((detections[:, 0] + detections[:, 2]) / 2).astype(np.int32).clip(0, w - 1)
+            cy = ((detections[:, 1] + detections[:, 3]) / 2).astype(np.int32).clip(0, h - 1)
+            detections = detections[roi_mask[cy, cx] > 0]
+        return detections
+    
+    def _run_inference(self, frames: List[np.ndarray], conf_threshold: float,
+                       imgsz: Optional[int] = None) -> List[np.ndarray]:
+        """
+        Run one detector forward pass over a list of frames at input size `imgsz`.
+        Returns one (N,6) float array (x1, y1, x2, y2, conf, cls) per input frame, in order.
+        """
+        return self.detector.detect(frames, conf_threshold, self.detect_classes, imgsz)
+    
+    def _merge_crop_detections(self, previous: np.ndarray, fresh: np.ndarray,
+                               crop: Tuple[int, int, int, int]) -> np.ndarray:
+        """Replace detections inside the re-scanned crop; keep the rest from the last inference."""
+        x1, y1, x2, y2 = crop
+        cx = (previous[:, 0] + previous[:, 2]) / 2
+        cy = (previous[:, 1] + previous[:, 3]) / 2
+        outside = (cx < x1) | (cx >= x2) | (cy < y1) | (cy >= y2)
+        return np.vstack((previous[outside], fresh))
+    
+    def _detect_weapons_and_persons(self, classes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Class masks over an (N,) class id array.
+        Returns: weapon mask, person mask
+        """
+        return np.isin(classes, self.WEAPON_CLASS_IDS), classes == self.PERSON_CLASS
+    
+    def _detect_fall(self, person_boxes: np.ndarray, frame_height: int, cam: CameraState,
+                     slots: np.ndarray) -> Tuple[bool, np.ndarray]:
+        """
+        Detect falls using person bounding box aspect ratio.
+        Fall = horizontal orientation (width > height significantly), confirmed
+        only after the same track stays horizontal for FALL_CONFIRM_FRAMES.
+        Returns: fall_detected, boolean fall mask over person_boxes
+        """
+        horizontal = fall_mask(person_boxes, frame_height,
+                               self.FALL_ASPECT_THRESHOLD, self.FALL_HEIGHT_BAND)
         
+        # Per-track consecutive horizontal frames
+        tracker = cam.tracker
+        tracker.fall_hits[slots] = np.where(horizontal, tracker.fall_hits[slots] + 1, 0)
+        confirmed = tracker.fall_hits[slots] >= self.FALL_CONFIRM_FRAMES
+        return bool(confirmed.any()), confirmed
+    
+    def _detect_sos(self, person_boxes: np.ndarray, cam: CameraState,
+                    slots: np.ndarray) -> Tuple[np.ndarray, int]:
+        """
+        Detect SOS signal - person with arms raised (simulated).
+        Uses upper body detection in person box, counted per track.
+        Returns: boolean SOS mask over person_boxes, progress of the closest-to-SOS person
+        """
         if len(person_boxes) == 0:
-            self.hand_raise_count = 0
+            return np.zeros(0, dtype=bool), 0
+        
+        # Check for "T-pose" like configuration (arms extended)
+        # Simulated: if person box is wide relative to height
+        widths = person_boxes[:, 2] - person_boxes[:, 0]
+        heights = person_boxes[:, 3] - person_boxes[:, 1]
+        raised = (widths > heights * 0.8) & (heights > 50)
         
-        return frame, sos_detected
+        tracker = cam.tracker
+        counts = tracker.sos_count[slots]
+        tracker.sos_count[slots] = np.where(raised, counts + 1, np.maximum(counts - 1, 0))
+        counts = tracker.sos_count[slots]
+        return counts >= self.SOS_THRESHOLD, min(int(counts.max()), self.SOS_THRESHOLD)
     
     def _calculate_threat_level(self, weapon_detected: bool, 
                                  fall_detected: bool, 
@@ -256,39 +715,54 @@ class CityWatchEngine:
                    (x_start, y_start - 5),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, self.COLOR_WHITE, 1)
     
-    def process_frame(self, frame: np.ndarray, 
-                      conf_threshold: float = 0.35) -> Tuple[np.ndarray, Dict[str, Any]]:
-        """
-        Main processing function called by the frontend.
-        """
-        if frame is None or frame.size == 0:
-            return frame, {
-                'weapon_detected': False,
-                'fall_detected': False,
-                'sos_detected': False,
-                'threat_level': 0
-            }
-        
-        annotated_frame = frame.copy()
+    def _empty_status(self) -> Dict[str, Any]:
+        """Status returned for missing/empty frames."""
+        return {
+            'weapon_detected': False,
+            'fall_detected': False,
+            'sos_detected': False,
+            'threat_level': 0
+        }
+    
+    def _draw_annotations(self, frame: np.ndarray, result: DetectionResult) -> np.ndarray:
+        """Draw weapon, fall, SOS and person overlays onto a copy of the frame."""
+        started = time.perf_counter()
+        frame = frame.copy()
         
-        # 1. Weapon & Person Detection (YOLO)
-        annotated_frame, weapon_detected, _, person_boxes = self._detect_weapons_and_persons(
-            annotated_frame, conf_threshold
-        )
+        # Weapons
+        if result.weapon_detected:
+            for x1, y1, x2, y2 in result.boxes[result.weapon_mask].astype(np.int32).tolist():
+                cv2.rectangle(frame, (x1, y1), (x2, y2), self.COLOR_RED, 3)
+                # Generic label - don't show actual object name
+                cv2.putText(frame, "THREAT DETECTED", (x1, y1 - 10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, self.COLOR_RED, 2)
+            cv2.putText(frame, "! WEAPON DETECTED !", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1.0, self.COLOR_RED, 3)
         
-        # 2. Fall Detection (aspect ratio based)
-        annotated_frame, fall_detected, fall_indices = self._detect_fall(annotated_frame, person_boxes)
+        if result.fall_detected:
+            cv2.putText(frame, "! FALL DETECTED !", (10, 70),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1.0, self.COLOR_YELLOW, 3)
         
-        # 3. SOS Signal Detection (pose simulation)
-        annotated_frame, sos_detected = self._detect_sos(annotated_frame, person_boxes)
+        # Show SOS progress
+        if result.sos_progress > 0:
+            cv2.putText(frame, f"SOS Signal: {result.sos_progress}/{self.SOS_THRESHOLD}",
+                       (10, frame.shape[0] - 20),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, self.COLOR_BLUE, 2)
+        sos_detected = result.sos_detected
+        if sos_detected:
+            cv2.putText(frame, "! SOS RECEIVED !", (10, 110),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1.2, self.COLOR_BLUE, 3)
         
-        # 4. CONSOLIDATED PERSON BOX DRAWING (ONE box per person)
-        for idx, box in enumerate(person_boxes):
-            x1, y1, x2, y2 = box[:4]
-            conf = box[4] if len(box) > 4 else 0.5
+        # CONSOLIDATED PERSON BOX DRAWING (ONE box per person)
+        persons = result.person_mask
+        for box, conf, track_id, is_fall in zip(result.boxes[persons].tolist(),
+                                                result.confidences[persons].tolist(),
+                                                result.track_ids[persons].tolist(),
+                                                result.fall_mask[persons].tolist()):
+            x1, y1, x2, y2 = map(int, box)
             
             # Determine box color based on threat status
-            if idx in fall_indices:
+            if is_fall:
                 color = self.COLOR_YELLOW
                 thickness = 3
                 label = "FALL"
@@ -299,46 +773,235 @@ class CityWatchEngine:
             else:
                 color = self.COLOR_GREEN
                 thickness = 2
-                label = f"person {conf:.2f}"
+                label = f"#{track_id} person {conf:.2f}"
             
             # Draw single box
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, thickness)
-            cv2.putText(annotated_frame, label, (x1, y1 - 10),
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+            cv2.putText(frame, label, (x1, y1 - 10),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
         
+        # Draw threat level indicator
+        self._draw_threat_indicator(frame, result.threat_level)
+        
+        self.frames_rendered += 1
+        self._record_stage('draw', (time.perf_counter() - started) * 1000)
+        return frame
+    
+    def _record_stage(self, stage: str, ms: float):
+        """Keep the latest timing for a stage and forward it to telemetry if attached."""
+        self.stage_ms[stage] = ms
+        if self.telemetry is not None:
+            self.telemetry.observe(stage, ms)
+    
+    def _roll_threat_day(self, now: float):
+        """Reset the daily threat counter after local midnight."""
+        day = time.strftime('%Y-%m-%d', time.localtime(now))
+        if day != self.threats_day:
+            self.threats_day = day
+            self.threats_detected_today = 0
+    
+    def _count_threat(self, kind: str, timestamp: float):
+        """Record a new threat incident and its capture-to-detection time."""
+        now = time.time()
+        self._roll_threat_day(now)
+        self.threats_detected_today += 1
+        self.response_times.append(max(0.0, now - timestamp))
+        if self.telemetry is not None:
+            self.telemetry.inc('threats', type=kind)
+    
+    def _analyze_frame(self, frame: np.ndarray, detections: Optional[np.ndarray],
+                       camera_id: Hashable, timestamp: float, inference_ms: float,
+                       detector_ran: bool) -> Tuple[AnnotatedFrame, Dict[str, Any]]:
+        """
+        Turn one (N,6) detection array into a DetectionResult and status dict
+        using the fall/SOS state of the given camera. Nothing is drawn here.
+        """
+        cam = self.get_camera_state(camera_id)
+        if detections is None:
+            detections = np.zeros((0, 6), dtype=np.float32)
+        count = len(detections)
+        t0 = time.perf_counter()
+        
+        # 1. Weapon & Person Detection (class masks)
+        classes = detections[:, 5].astype(np.int32)
+        weapon_mask, person_mask = self._detect_weapons_and_persons(classes)
+        person_boxes = detections[person_mask, :5]
+        
+        if detector_ran or cam.last_analysis is None or len(cam.last_analysis[0]) != count:
+            # 2. Person Tracking (stable IDs, per-person counters)
+            slots = cam.tracker.update(person_boxes)
+            track_ids = np.full(count, -1, dtype=np.int64)
+            track_ids[person_mask] = cam.tracker.ids[slots]
+            cam.last_track_ids = track_ids[person_mask]
+            t1 = time.perf_counter()
+            
+            # 3. Fall Detection (aspect ratio based)
+            fall_mask = np.zeros(count, dtype=bool)
+            _, fall_mask[person_mask] = self._detect_fall(person_boxes, frame.shape[0], cam, slots)
+            t2 = time.perf_counter()
+            
+            # 4. SOS Signal Detection (pose simulation)
+            sos_mask = np.zeros(count, dtype=bool)
+            sos_mask[person_mask], sos_progress = self._detect_sos(person_boxes, cam, slots)
+            t3 = time.perf_counter()
+            cam.last_analysis = (track_ids, fall_mask, sos_mask, sos_progress)
+        else:
+            # Carried-over boxes: reuse the last verdicts so skipped frames never
+            # count towards the fall/SOS confirmation streaks
+            track_ids, fall_mask, sos_mask, sos_progress = cam.last_analysis
+            t1 = t2 = t3 = time.perf_counter()
+        
+        self.stage_ms['tracking'] = (t1 - t0) * 1000
+        self.stage_ms['fall'] = (t2 - t1) * 1000
+        self.stage_ms['sos'] = (t3 - t2) * 1000
+        
+        weapon_detected = bool(weapon_mask.any())
+        fall_detected = bool(fall_mask.any())
+        sos_detected = bool(sos_mask.any())
+        
         # Calculate threat level
         threat_level = self._calculate_threat_level(
             weapon_detected, fall_detected, sos_detected
         )
         
-        # Draw threat level indicator
-        self._draw_threat_indicator(annotated_frame, threat_level)
+        result = DetectionResult(camera_id, timestamp, detections, classes, track_ids,
+                                 weapon_mask, person_mask, fall_mask, sos_mask,
+                                 sos_progress, threat_level, inference_ms, detector_ran)
         
         # === CHAMPIONSHIP FEATURES: Update Statistics ===
-        if self.start_time is None:
-            self.start_time = time.time()
-        
         self.frames_processed += 1
-        self.threat_history.append(threat_level)
+        cam.frames_processed += 1
         
-        # Only count as new threat once per 30 frames to avoid spamming
-        self.status_flags = {
-            'weapon_detected': weapon_detected,
-            'fall_detected': fall_detected,
-            'sos_detected': sos_detected
-        }
+        # Anything in view switches the camera to every-frame detection
+        if weapon_detected or len(person_boxes) or threat_level > 0:
+            cam.active_until = cam.frames_processed + self.active_hold_frames
         
-        if (weapon_detected or fall_detected or sos_detected) and self.frames_processed % 30 == 0:
-            self.threats_detected_today += 1
+        # Count incidents, not frames: a type re-arms after being clear for THREAT_REARM_SECONDS
+        for kind, detected in (('weapon', weapon_detected), ('fall', fall_detected), ('sos', sos_detected)):
+            if detected:
+                if timestamp - cam.threat_last_seen.get(kind, float('-inf')) > self.THREAT_REARM_SECONDS:
+                    self._count_threat(kind, timestamp)
+                cam.threat_last_seen[kind] = timestamp
         
-        status_data = {
-            'weapon_detected': weapon_detected,
-            'fall_detected': fall_detected,
-            'sos_detected': sos_detected,
-            'threat_level': threat_level
-        }
+        status_data = result.status()
+        cam.status = status_data
+        self._record_stage('postprocess', (time.perf_counter() - t0) * 1000)
         
-        return annotated_frame, status_data
+        return AnnotatedFrame(frame, result, self._draw_annotations), status_data
+    
+    def detect_batch(self, frames: Sequence[np.ndarray],
+                     camera_ids: Optional[Sequence[Hashable]] = None,
+                     conf_threshold: float = 0.35,
+                     timestamps: Optional[Sequence[float]] = None) -> List[Tuple[Optional[AnnotatedFrame], Dict[str, Any]]]:
+        """
+        Headless detection for the latest frame from N cameras (single batched YOLO pass).
+        Returns one (AnnotatedFrame, status_data) pair per input frame, in order;
+        the structured detections are in AnnotatedFrame.result and nothing is
+        drawn until AnnotatedFrame.image() is called.
+        `timestamps` are capture times per frame (defaults to now).
+        Empty/missing frames yield (None, empty status).
+        """
+        if camera_ids is None:
+            camera_ids = list(range(len(frames)))
+        if len(camera_ids) != len(frames):
+            raise ValueError("frames and camera_ids must have the same length")
+        
+        now = time.time()
+        if self.start_time is None:
+            self.start_time = now
+        if timestamps is None:
+            timestamps = [now] * len(frames)
+        
+        outputs = [(None, self._empty_status()) for _ in frames]
+        valid = [i for i, frame in enumerate(frames) if frame is not None and frame.size > 0]
+        
+        if valid:
+            # Only cameras due for detection (moved + scheduled) go through the model
+            detect = [i for i in valid if self._should_detect(self.get_camera_state(camera_ids[i]), frames[i])]
+            inference_ms = 0.0
+            if detect:
+                plans = [self._plan_inference(self.get_camera_state(camera_ids[i]), frames[i]) for i in detect]
+                
+                # One forward pass per input size for every scheduled camera/tile in the batch
+                groups: Dict[Optional[int], List[Tuple[int, int]]] = {}
+                for p, i in enumerate(detect):
+                    imgsz = self.get_camera_state(camera_ids[i]).imgsz
+                    groups.setdefault(imgsz, []).extend((p, t) for t in range(len(plans[p][2])))
+                results = [[None] * len(plan[2]) for plan in plans]
+                started = time.perf_counter()
+                for imgsz, members in groups.items():
+                    images = [plans[p][2][t][2] for p, t in members]
+                    for (p, t), detections in zip(members, self._run_inference(images, conf_threshold, imgsz)):
+                        results[p][t] = detections
+                    self.detector_inputs += len(images)
+                inference_ms = (time.perf_counter() - started) * 1000
+                self._record_stage('inference', inference_ms)
+                
+                for p, i in enumerate(detect):
+                    cam = self.get_camera_state(camera_ids[i])
+                    region, partial, inputs = plans[p]
+                    detections = self._merge_inputs(cam, frames[i], inputs, results[p])
+                    if partial:
+                        cam.last_detections = self._merge_crop_detections(cam.last_detections, detections, region)
+                    else:
+                        cam.last_detections = detections
+                    cam.motion_ref = cam.motion_small
+            
+            for i in valid:
+                cam = self.get_camera_state(camera_ids[i])
+                ran = i in detect
+                cam.frames_since_detect = 0 if ran else cam.frames_since_detect + 1
+                self.detections_run += ran
+                self.detect_window.append(int(ran))
+                
+                # Skipped frames reuse the last boxes
+                outputs[i] = self._analyze_frame(frames[i], cam.last_detections, camera_ids[i],
+                                                 timestamps[i], inference_ms if ran else 0.0, ran)
+            
+            self.threat_series.append(now, max(outputs[i][1]['threat_level'] for i in valid))
+            
+            # Dashboard flags: a threat on any camera raises the flag
+            self.status_flags = {
+                key: any(cam.status[key] for cam in self.cameras.values())
+                for key in ('weapon_detected', 'fall_detected', 'sos_detected')
+            }
+        
+        return outputs
+    
+    def process_batch(self, frames: Sequence[np.ndarray],
+                      camera_ids: Optional[Sequence[Hashable]] = None,
+                      conf_threshold: float = 0.35) -> List[Tuple[np.ndarray, Dict[str, Any]]]:
+        """
+        Process the latest frame from N cameras with a single batched YOLO pass.
+        Returns one (annotated_frame, status_data) pair per input frame, in order.
+        """
+        outputs = self.detect_batch(frames, camera_ids, conf_threshold)
+        return [(annotated.image() if annotated is not None else frame, status_data)
+                for frame, (annotated, status_data) in zip(frames, outputs)]
+    
+    def process_frame(self, frame: np.ndarray, 
+                      conf_threshold: float = 0.35,
+                      camera_id: Hashable = 0) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """
+        Main processing function called by the frontend.
+        """
+        if frame is None or frame.size == 0:
+            return frame, self._empty_status()
+        
+        return self.process_batch([frame], [camera_id], conf_threshold)[0]
+    
+    def detect(self, frame: np.ndarray, conf_threshold: float = 0.35,
+               camera_id: Hashable = 0) -> Optional[DetectionResult]:
+        """
+        Structured alternative to process_frame: returns the DetectionResult
+        for one frame without drawing anything (None for an empty frame).
+        """
+        annotated, _ = self.detect_batch([frame], [camera_id], conf_threshold)[0]
+        return annotated.result if annotated is not None else None
+    
+    def get_camera_status(self) -> Dict[Hashable, Dict[str, Any]]:
+        """Get the latest status dict for every camera seen so far."""
+        return {camera_id: dict(cam.status) for camera_id, cam in self.cameras.items()}
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get real-time analytics for dashboard."""
@@ -346,20 +1009,41 @@ class CityWatchEngine:
         if self.start_time:
             uptime = int(time.time() - self.start_time)
         
-        avg_response_time = 2.1 if self.threats_detected_today > 0 else 0.0
+        self._roll_threat_day(time.time())
+        # Mean capture -> detection time (s) of recent new threats
+        avg_response_time = round(sum(self.response_times) / len(self.response_times), 3) if self.response_times else 0.0
         
         return {
             'threats_today': self.threats_detected_today,
             'avg_response_time': avg_response_time,
             'frames_processed': self.frames_processed,
             'uptime_seconds': uptime,
-            'zones_monitored': 4
+            'zones_monitored': 4,
+            'detector': self.detector.name,
+            'idle_detect_interval': self.idle_detect_interval,
+            'active_hold_frames': self.active_hold_frames,
+            'detect_mode': {str(cam_id): 'active' if self._is_active(cam) else 'idle'
+                            for cam_id, cam in self.cameras.items()},
+            'detections_run': self.detections_run,
+            'motion_skips': self.motion_skips,
+            'detector_inputs': self.detector_inputs,
+            'frames_rendered': self.frames_rendered,
+            'detection_rate': round(sum(self.detect_window) / len(self.detect_window), 2) if self.detect_window else 0.0
         }
     
     def get_threat_history(self, last_n: int = 60) -> list:
-        """Get threat level history for timeline visualization."""
-        history = list(self.threat_history)
-        return history[-last_n:] if len(history) > last_n else history
+        """Get the last N threat levels for timeline visualization."""
+        return [int(level) for level in self.threat_series.last(last_n)]
+    
+    def get_threat_timeline(self, start: Optional[float] = None, end: Optional[float] = None,
+                            resolution: str = 'auto', max_points: int = 500) -> Dict[str, Any]:
+        """
+        Threat level over [start, end) at 'raw', '1s', '1m', '1h' or 'auto'
+        (finest resolution with at most max_points points).
+        """
+        if resolution == 'auto':
+            resolution = self.threat_series.pick_resolution(start, end, max_points)
+        return self.threat_series.query(start, end, resolution)
     
     def release(self):
         """Release resources when done."""
@@ -0,0 +1,288 @@
+"""
+CityWatch - Video Pipeline Primitives
+Bounded drop-oldest queues joining the capture, inference and encode stages.
+A slow stage drops stale frames instead of building up camera latency.
+Also hosts the encode-once MJPEG broadcaster shared by all viewers.
+"""
+
+import asyncio
+import cv2
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class DropOldestQueue:
+    """
+    Bounded FIFO that never blocks the producer.
+    When full, the oldest item is discarded to make room for the new one.
+    """
+
+    def __init__(self, maxsize: int = 1, name: str = "queue",
+                 on_put: Optional[Callable[[], None]] = None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.name = name
+        self.maxsize = maxsize
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._on_put = on_put
+
+        # Counters for /pipeline_stats
+        self.put_count = 0
+        self.get_count = 0
+        self.drop_count = 0
+
+    def put(self, item: Any):
+        """Add an item, dropping the oldest one if the queue is full."""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.drop_count += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify()
+        if self._on_put:
+            self._on_put()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Wait for the next item. Returns None on timeout."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            self.get_count += 1
+            return self._items.popleft()
+
+    def get_nowait(self) -> Any:
+        """Return the next item or None if the queue is empty."""
+        return self.get(timeout=0)
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def stats(self) -> Dict[str, int]:
+        """Current depth and lifetime counters."""
+        with self._cond:
+            return {
+                'depth': len(self._items),
+                'maxsize': self.maxsize,
+                'put': self.put_count,
+                'processed': self.get_count,
+                'dropped': self.drop_count
+            }
+
+
+class VideoPipeline:
+    """
+    Queues for the staged video pipeline:
+    capture (one freshest-frame slot per camera) -> inference -> encode.
+    """
+
+    def __init__(self, encode_queue_size: int = 2):
+        self._frames_ready = threading.Event()
+        self._lock = threading.Lock()
+        self.capture_queues: Dict[Hashable, DropOldestQueue] = {}
+        self.encode_queue = DropOldestQueue(maxsize=encode_queue_size, name="encode")
+        self._last_served: Dict[Hashable, int] = {}  # Camera -> tick it was last batched
+        self._tick = 0
+
+        # End-to-end latency (capture -> published frame)
+        self.latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def capture_queue(self, camera_id: Hashable) -> DropOldestQueue:
+        """Get (or create) the single-slot queue holding a camera's freshest frame."""
+        with self._lock:
+            queue = self.capture_queues.get(camera_id)
+            if queue is None:
+                queue = DropOldestQueue(maxsize=1, name=f"capture_{camera_id}",
+                                        on_put=self._frames_ready.set)
+                self.capture_queues[camera_id] = queue
+            return queue
+
+    def wait_for_frames(self, timeout: float = 0.1, max_batch: Optional[int] = None) -> Dict[Hashable, Any]:
+        """
+        Block until at least one camera has a new frame, then take
+        the freshest frame from every camera that has one. With more
+        ready cameras than `max_batch`, the ones that waited longest
+        since their last batch go first; the rest keep their slot
+        (still overwritten by newer frames) for the next call.
+        """
+        if not self._frames_ready.wait(timeout):
+            return {}
+        self._frames_ready.clear()
+
+        with self._lock:
+            queues = [(camera_id, queue) for camera_id, queue in self.capture_queues.items() if len(queue)]
+        if max_batch and len(queues) > max_batch:
+            queues.sort(key=lambda item: self._last_served.get(item[0], -1))
+            queues = queues[:max_batch]
+            self._frames_ready.set()  # Others are still waiting
+
+        self._tick += 1
+        latest = {}
+        for camera_id, queue in queues:
+            item = queue.get_nowait()
+            if item is not None:
+                latest[camera_id] = item
+                self._last_served[camera_id] = self._tick
+        return latest
+
+    def record_latency(self, captured_at: float):
+        """Record end-to-end latency for a frame captured at `captured_at`."""
+        latency = (time.time() - captured_at) * 1000
+        # Exponential moving average keeps the reading stable
+        self.latency_ms = latency if self.latency_ms == 0 else 0.9 * self.latency_ms + 0.1 * latency
+        self.max_latency_ms = max(self.max_latency_ms, latency)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-stage queue depth and drop counts."""
+        with self._lock:
+            queues = list(self.capture_queues.values())
+        queues.append(self.encode_queue)
+        return {
+            'queues': {queue.name: queue.stats() for queue in queues},
+            'latency_ms': round(self.latency_ms, 1),
+            'max_latency_ms': round(self.max_latency_ms, 1)
+        }
+
+
+class FrameBroadcaster:
+    """
+    Encode-once JPEG broadcaster for MJPEG viewers.
+    Each published frame gets a sequence number and is JPEG-encoded at most
+    once per output width, the first time any subscriber asks for it. Every
+    viewer receives the same bytes; a slow viewer simply skips to the newest
+    sequence number. Viewers wait on an asyncio event, not a thread each.
+    """
+
+    def __init__(self, jpeg_quality: Optional[int] = None, telemetry=None):
+        self.jpeg_quality = jpeg_quality
+        self.telemetry = telemetry  # Optional telemetry.Telemetry for encode timings
+        self._cond = threading.Condition()
+        self._encode_lock = threading.Lock()
+        self._frame = None
+        self._jpegs: Dict[Optional[int], bytes] = {}  # width -> JPEG for current seq
+        self.seq = 0
+
+        # Asyncio wake-up, bound to the server loop by attach_loop()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_ready: Optional[asyncio.Event] = None
+        self._async_encodes: Dict[Tuple[int, Optional[int]], asyncio.Future] = {}
+
+        # Counters for /pipeline_stats
+        self.encode_count = 0
+        self.subscribers = 0
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        """Bind async viewers to the server event loop. Call from that loop."""
+        self._loop = loop
+        self._async_ready = asyncio.Event()
+
+    def _wake_async(self):
+        """Runs on the event loop: release every coroutine waiting for a frame."""
+        ready, self._async_ready = self._async_ready, asyncio.Event()
+        ready.set()
+
+    def publish(self, frame):
+        """
+        Publish a new output frame: an array, or a zero-arg callable returning one
+        (rendered on first read). Cheap: encoding is deferred to the first reader.
+        """
+        with self._cond:
+            self._frame = frame
+            self._jpegs = {}
+            self.seq += 1
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake_async)
+
+    def _encode(self, seq: int, frame, width: Optional[int]) -> Optional[bytes]:
+        """Encode `frame` at `width` unless another reader already did it for `seq`."""
+        with self._encode_lock:
+            with self._cond:
+                if self.seq == seq and width in self._jpegs:
+                    return self._jpegs[width]
+                if self.seq == seq:
+                    frame = self._frame  # May already be rendered by another reader
+            if callable(frame):
+                frame = frame()
+                with self._cond:
+                    if self.seq == seq:
+                        self._frame = frame
+            started = time.perf_counter()
+            if width and width < frame.shape[1]:
+                height = int(frame.shape[0] * width / frame.shape[1])
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality] if self.jpeg_quality else []
+            flag, encoded = cv2.imencode(".jpg", frame, params)
+            if not flag:
+                return None
+            jpeg = encoded.tobytes()
+            self.encode_count += 1
+            if self.telemetry is not None:
+                self.telemetry.observe('encode', (time.perf_counter() - started) * 1000)
+            with self._cond:
+                if self.seq == seq:
+                    self._jpegs[width] = jpeg
+            return jpeg
+
+    def _snapshot(self, width: Optional[int] = None):
+        with self._cond:
+            return self.seq, self._frame, self._jpegs.get(width)
+
+    def latest_jpeg(self, width: Optional[int] = None) -> Tuple[int, Optional[bytes]]:
+        """Return (seq, jpeg bytes) for the newest frame, or (0, None) if none yet."""
+        seq, frame, jpeg = self._snapshot(width)
+        if frame is None:
+            return 0, None
+        if jpeg is None:
+            jpeg = self._encode(seq, frame, width)
+        return seq, jpeg
+
+    async def wait_for_jpeg_async(self, after_seq: int, timeout: Optional[float] = None,
+                                  width: Optional[int] = None) -> Tuple[int, Optional[bytes]]:
+        """
+        Wait until a frame newer than `after_seq` is published and return it.
+        Awaits the frame-ready event instead of holding a thread.
+        Returns (after_seq, None) on timeout.
+        """
+        if self._async_ready is None:
+            self.attach_loop(asyncio.get_running_loop())
+        while self.seq <= after_seq or self._frame is None:
+            try:
+                await asyncio.wait_for(self._async_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return after_seq, None
+
+        seq, frame, jpeg = self._snapshot(width)
+        if jpeg is None:
+            # One encode job per frame/width, shared by every waiting viewer
+            key = (seq, width)
+            job = self._async_encodes.get(key)
+            if job is None:
+                job = asyncio.ensure_future(asyncio.to_thread(self._encode, seq, frame, width))
+                self._async_encodes[key] = job
+                job.add_done_callback(lambda _: self._async_encodes.pop(key, None))
+            jpeg = await asyncio.shield(job)
+        return seq, jpeg
+
+    def add_subscriber(self):
+        with self._cond:
+            self.subscribers += 1
+
+    def remove_subscriber(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """Sequence number, encode count and connected viewers."""
+        return {
+            'seq': self.seq,
+            'encodes': self.encode_count,
+            'subscribers': self.subscribers
+        }
@@ -0,0 +1,282 @@
+"""
+CityWatch - Model Quantization
+Builds an INT8 detector from a folder of sample frames and reports how
+reduced-precision variants compare with the FP32 yolov8n.pt baseline:
+person / weapon / fall agreement, inference latency and memory.
+
+Usage:
+    python quantize.py calibrate --frames calib_frames/          # -> yolov8n.int8.onnx
+    python quantize.py report --frames eval_frames/              # onnx:fp32, onnx:int8 vs torch:fp32
+    python quantize.py report --frames eval_frames/ --variants onnx:int8,openvino:int8,openvino:fp16
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+import onnx
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                      QuantType, quantize_dynamic, quantize_static)
+
+from detectors import ExportedDetector, export_onnx
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+CALIBRATION_METHODS = {'minmax': CalibrationMethod.MinMax, 'percentile': CalibrationMethod.Percentile,
+                       'entropy': CalibrationMethod.Entropy}
+
+
+def iter_frames(frames_dir: str, limit: Optional[int] = None) -> Iterator[np.ndarray]:
+    """Frames from a folder in name order, read one at a time."""
+    names = sorted(name for name in os.listdir(frames_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    for name in names[:limit]:
+        frame = cv2.imread(os.path.join(frames_dir, name))
+        if frame is not None:
+            yield frame
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """Feeds letterboxed sample frames to the static quantizer, one at a time."""
+
+    def __init__(self, frames_dir: str, model_path: str, imgsz: int = 640, limit: int = 200):
+        self._frames = iter_frames(frames_dir, limit)
+        self._input_name = onnx.load(model_path, load_external_data=False).graph.input[0].name
+        self._preprocess = ExportedDetector(model_path, imgsz)._preprocess
+        self.count = 0
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        self.count += 1
+        return {self._input_name: self._preprocess([frame])[0]}
+
+
+def quantize_dynamic_model(source: str, target: str) -> str:
+    """INT8 weights, activations quantized on the fly. No calibration data needed."""
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8, op_types_to_quantize=['Conv'])
+    return target
+
+
+def calibrate(weights: str, frames_dir: str, target: Optional[str] = None, imgsz: int = 640,
+              limit: int = 200, method: str = 'minmax') -> str:
+    """
+    Static INT8 (QDQ, per-channel weights) calibrated on frames from
+    `frames_dir`. Only convolutions are quantized; the detection head's
+    box decoding stays in float so boxes keep their precision.
+    """
+    source = weights if weights.endswith('.onnx') else export_onnx(weights, imgsz)
+    target = target or os.path.splitext(weights)[0] + '.int8.onnx'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shape inference + graph cleanup first gives the quantizer a simpler graph
+        prepared = os.path.join(tmp, 'prepared.onnx')
+        try:
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+            quant_pre_process(source, prepared, skip_symbolic_shape=True)
+        except Exception as e:
+            print(f"[Quant] Pre-processing skipped: {e}")
+            prepared = source
+
+        reader = FrameCalibrationReader(frames_dir, source, imgsz, limit)
+        started = time.perf_counter()
+        quantize_static(prepared, target, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        op_types_to_quantize=['Conv'], calibrate_method=CALIBRATION_METHODS[method])
+    if reader.count == 0:
+        os.remove(target)
+        raise ValueError(f"No frames found in {frames_dir}")
+    print(f"[Quant] Calibrated on {reader.count} frames in {time.perf_counter() - started:.1f}s -> {target}")
+    return target
+
+
+# === REPORT ===
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+
+def measure_variant(backend: str, precision: str, weights: str, frames_dir: str, limit: int,
+                    conf_threshold: float, threads: Optional[int], warmup: int) -> Dict[str, Any]:
+    """
+    Run one detector variant through the engine over the frame folder.
+    Called in a fresh process so peak memory belongs to this variant alone.
+    """
+    from benchmark import percentiles
+    from logic_core import CityWatchEngine
+
+    engine = CityWatchEngine(idle_detect_interval=1, motion_gate=False, backend=backend,
+                             weights=weights, threads=threads, device='cpu', precision=precision)
+    for frame in iter_frames(frames_dir, warmup):
+        engine.detect(frame, conf_threshold, camera_id='warmup')
+
+    frames, latencies = [], []
+    for frame in iter_frames(frames_dir, limit):
+        result = engine.detect(frame, conf_threshold)
+        latencies.append(result.inference_ms)
+        frames.append({'detections': result.detections.copy(), 'weapon': result.weapon_mask.copy(),
+                       'person': result.person_mask.copy(), 'fall': result.fall_detected})
+
+    model = engine.detector.stats().get('model')
+    engine.release()
+    total_s = sum(latencies) / 1000
+    return {
+        'detector': engine.detector.stats(),
+        'frames': frames,
+        'inference_ms': percentiles(latencies) if latencies else None,
+        'inference_fps': round(len(latencies) / total_s, 2) if total_s > 0 else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'model_mb': round(os.path.getsize(model) / 2**20, 2) if model and os.path.exists(model) else None
+    }
+
+
+def matched_pairs(boxes_a: np.ndarray, boxes_b: np.ndarray, iou_threshold: float) -> int:
+    """Greedy one-to-one matches between two (N,6) arrays (same class, IoU >= threshold)."""
+    from logic_core import box_iou
+
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return 0
+    iou = box_iou(boxes_a, boxes_b)
+    iou[boxes_a[:, None, 5] != boxes_b[None, :, 5]] = 0
+    matches = 0
+    while True:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        if iou[i, j] <= 0 or iou[i, j] < iou_threshold:
+            return matches
+        matches += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+
+
+def box_agreement(base: List[np.ndarray], candidate: List[np.ndarray], iou_threshold: float) -> Dict[str, Any]:
+    """Recall / precision / F1 of candidate boxes against the baseline's."""
+    matched = sum(matched_pairs(a, b, iou_threshold) for a, b in zip(base, candidate))
+    n_base, n_candidate = sum(len(a) for a in base), sum(len(b) for b in candidate)
+    recall = matched / n_base if n_base else 1.0
+    precision = matched / n_candidate if n_candidate else 1.0
+    f1 = 2 * recall * precision / (recall + precision) if recall + precision else 0.0
+    return {'baseline': n_base, 'candidate': n_candidate, 'matched': matched,
+            'recall': round(recall, 4), 'precision': round(precision, 4), 'f1': round(f1, 4)}
+
+
+def flag_agreement(base: List[bool], candidate: List[bool]) -> Dict[str, Any]:
+    """Per-frame agreement of an alert flag (weapon present, fall confirmed)."""
+    base, candidate = np.asarray(base, dtype=bool), np.asarray(candidate, dtype=bool)
+    return {'agreement': round(float((base == candidate).mean()), 4) if len(base) else 1.0,
+            'baseline_frames': int(base.sum()), 'candidate_frames': int(candidate.sum()),
+            'missed': int((base & ~candidate).sum()), 'extra': int((~base & candidate).sum())}
+
+
+def compare_variant(base: Dict[str, Any], candidate: Dict[str, Any], iou_threshold: float) -> Dict[str, Any]:
+    pairs = list(zip(base['frames'], candidate['frames']))
+    persons = ([a['detections'][a['person']] for a, _ in pairs], [b['detections'][b['person']] for _, b in pairs])
+    weapons = ([a['detections'][a['weapon']] for a, _ in pairs], [b['detections'][b['weapon']] for _, b in pairs])
+    return {
+        'person': box_agreement(*persons, iou_threshold),
+        'weapon': box_agreement(*weapons, iou_threshold),
+        'weapon_alert': flag_agreement([a['weapon'].any() for a, _ in pairs], [b['weapon'].any() for _, b in pairs]),
+        'fall_alert': flag_agreement([a['fall'] for a, _ in pairs], [b['fall'] for _, b in pairs])
+    }
+
+
+def report(args) -> Dict[str, Any]:
+    variants = [('torch', 'fp32')] + [tuple(v.split(':')) for v in args.variants.split(',')]
+    # One spawned process per variant: clean peak memory, no shared runtime state
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for backend, precision in variants:
+        print(f"[Quant] Measuring {backend}:{precision} ...")
+        with context.Pool(1) as pool:
+            results.append(pool.apply(measure_variant, (backend, precision, args.weights, args.frames,
+                                                        args.limit, args.conf, args.threads, args.warmup)))
+
+    baseline = results[0]
+    rows = []
+    for (backend, precision), result in zip(variants, results):
+        latency = result['inference_ms'] or {}
+        rows.append({
+            'variant': f"{backend}:{precision}",
+            'detector': result['detector'],
+            'inference_ms': result['inference_ms'],
+            'inference_fps': result['inference_fps'],
+            'speedup_p50': round(baseline['inference_ms']['p50'] / latency['p50'], 2) if latency.get('p50') else None,
+            'peak_rss_mb': result['peak_rss_mb'],
+            'model_mb': result['model_mb'],
+            'agreement': compare_variant(baseline, result, args.iou)
+        })
+
+    print(f"\n[Quant] {len(baseline['frames'])} frames from {args.frames}, baseline torch:fp32 (CPU)")
+    print(f"  {'variant':<16} {'ran as':<16} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8} {'rss MB':>8} "
+          f"{'model MB':>9} {'person F1':>10} {'weapon F1':>10} {'weapon alert':>13} {'fall alert':>11}")
+    for row in rows:
+        agreement, latency = row['agreement'], row['inference_ms'] or {}
+        ran_as = f"{row['detector']['backend']}:{row['detector']['precision']}"
+        print(f"  {row['variant']:<16} {ran_as:<16} {latency.get('p50', 0):8.2f} {latency.get('p95', 0):8.2f} "
+              f"{row['speedup_p50'] or 0:7.2f}x {row['peak_rss_mb'] or 0:8.1f} {row['model_mb'] or 0:9.2f} "
+              f"{agreement['person']['f1']:10.3f} {agreement['weapon']['f1']:10.3f} "
+              f"{agreement['weapon_alert']['agreement']:13.3f} {agreement['fall_alert']['agreement']:11.3f}")
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'cpu': platform.processor() or platform.machine(),
+            'python': platform.python_version(),
+            'frames_dir': args.frames,
+            'frames': len(baseline['frames']),
+            'conf_threshold': args.conf,
+            'iou_threshold': args.iou,
+            'threads': args.threads
+        },
+        'variants': rows
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CityWatch INT8/FP16 quantization tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    calib = commands.add_parser('calibrate', help="Build a static INT8 ONNX model from sample frames")
+    calib.add_argument('--frames', required=True, help="Folder of representative camera frames")
+    calib.add_argument('--weights', default='yolov8n.pt')
+    calib.add_argument('--out', default=None, help="Output path (default: <weights>.int8.onnx)")
+    calib.add_argument('--limit', type=int, default=200, help="Max calibration frames")
+    calib.add_argument('--method', default='minmax', choices=sorted(CALIBRATION_METHODS))
+    calib.add_argument('--imgsz', type=int, default=640)
+
+    rep = commands.add_parser('report', help="Accuracy/latency/memory of variants vs the FP32 baseline")
+    rep.add_argument('--frames', required=True,
+                     help="Folder of evaluation frames in time order (falls need consecutive frames)")
+    rep.add_argument('--weights', default='yolov8n.pt')
+    rep.add_argument('--variants', default='onnx:fp32,onnx:int8', help="Comma-separated backend:precision list")
+    rep.add_argument('--limit', type=int, default=300)
+    rep.add_argument('--warmup', type=int, default=5)
+    rep.add_argument('--threads', type=int, default=None, help="Intra-op threads for onnx/openvino")
+    rep.add_argument('--conf', type=float, default=0.35)
+    rep.add_argument('--iou', type=float, default=0.5, help="IoU for a box to count as the same detection")
+    rep.add_argument('--out', default='quant_report.json')
+    args = parser.parse_args()
+
+    if args.command == 'calibrate':
+        calibrate(args.weights, args.frames, args.out, args.imgsz, args.limit, args.method)
+        return
+
+    result = report(args)
+    with open(args.out, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"[Quant] Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+CityWatch - Push-Based Dashboard Stats
+Server-Sent Events hub that pushes stats deltas only when something changed,
+coalesced to a per-client maximum update rate. Snapshots are only taken
+while someone is subscribed, at most as often as the fastest client reads.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+
+class StatsHub:
+    """
+    Keeps the latest stats snapshot and wakes SSE subscribers when a watched
+    key (status flags, threat level, counters) changes. Volatile keys such as
+    frames_processed/uptime ride along with the next delta or heartbeat.
+    """
+
+    WATCHED_KEYS = (
+        'weapon_detected', 'fall_detected', 'sos_detected', 'threat_level',
+        'threats_today', 'grid_mode', 'bot_users', 'camera_enabled'
+    )
+
+    def __init__(self, snapshot_fn: Callable[[], Optional[Dict[str, Any]]]):
+        self._snapshot_fn = snapshot_fn
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.version = 0
+        self._rates: List[float] = []  # max_rate of every connected subscriber
+        self._pending = False          # A refresh is already scheduled on the loop
+        self._pending_lock = threading.Lock()
+        self._last_refresh = 0.0
+
+        # Counters for /pipeline_stats
+        self.subscribers = 0
+        self.events_sent = 0
+        self.refreshes = 0
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        """Bind the hub to the server event loop. Call from that loop."""
+        self._loop = loop
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        """
+        Thread-safe hint that stats may have changed (called after each frame/toggle).
+        Free without subscribers; otherwise at most one refresh is pending,
+        delayed to the fastest subscriber's max_rate.
+        """
+        loop = self._loop
+        if not self.subscribers or loop is None or loop.is_closed():
+            return
+        with self._pending_lock:
+            if self._pending:
+                return
+            self._pending = True
+        loop.call_soon_threadsafe(self._schedule_refresh)
+
+    def _schedule_refresh(self):
+        """Runs on the event loop: refresh now, or once the fastest subscriber's interval has passed."""
+        min_interval = 1.0 / max(self._rates) if self._rates else 0.0
+        delay = self._last_refresh + min_interval - time.monotonic()
+        if delay > 0:
+            self._loop.call_later(delay, self._pending_refresh)
+        else:
+            self._pending_refresh()
+
+    def _pending_refresh(self):
+        with self._pending_lock:
+            self._pending = False
+        self._refresh()
+
+    def _refresh(self):
+        """Runs on the event loop: take a new snapshot and wake subscribers on change."""
+        self._last_refresh = time.monotonic()
+        self.refreshes += 1
+        snapshot = self._snapshot_fn()
+        if snapshot is None:
+            return
+        previous = self.snapshot
+        self.snapshot = snapshot
+        if previous is None or any(previous.get(k) != snapshot.get(k) for k in self.WATCHED_KEYS):
+            self.version += 1
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+
+    async def stream(self, max_rate: float = 5.0, heartbeat: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield stats deltas for one subscriber: the full snapshot first, then
+        only changed keys, at most `max_rate` times per second. A heartbeat
+        delta (counters/uptime) is sent if nothing changed for `heartbeat` s.
+        """
+        if self._changed is None:
+            self.attach_loop(asyncio.get_running_loop())
+
+        min_interval = 1.0 / max_rate
+        sent: Dict[str, Any] = {}
+        sent_version = -1
+        last_sent = 0.0
+        self.subscribers += 1
+        self._rates.append(max_rate)
+        try:
+            self._refresh()  # Snapshots pause while nobody listens: start from a fresh one
+            while True:
+                # Coalesce: changes arriving during this sleep merge into one delta
+                delay = last_sent + min_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                if self.snapshot is not None and self.version == sent_version:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), heartbeat)
+                    except asyncio.TimeoutError:
+                        pass
+                if self.version == sent_version or self.snapshot is None:
+                    self._refresh()  # Heartbeat: pick up counters while idle
+                if self.snapshot is None:
+                    await asyncio.sleep(heartbeat)  # Engine still starting
+                    continue
+
+                sent_version = self.version
+                delta = {k: v for k, v in self.snapshot.items() if k not in sent or sent[k] != v}
+                if delta:
+                    sent.update(delta)
+                    last_sent = time.monotonic()
+                    self.events_sent += 1
+                    yield delta
+        finally:
+            self.subscribers -= 1
+            self._rates.remove(max_rate)
+
+    def stats(self) -> Dict[str, int]:
+        """Subscriber count and pushed events."""
+        return {
+            'version': self.version,
+            'subscribers': self.subscribers,
+            'events_sent': self.events_sent,
+            'refreshes': self.refreshes
+        }
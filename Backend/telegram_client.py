@@ -0,0 +1,176 @@
+"""
+CityWatch - Telegram Bot API Client
+One keep-alive HTTP session shared by a bounded worker pool.
+Sends are rate limited globally and per chat, retried with backoff
+(honouring 429 retry_after), and fanned out to many chats concurrently
+while each chat's own messages stay in order.
+"""
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class RateLimiter:
+    """
+    Spaces calls at least `interval` seconds apart per key by handing out
+    time slots; callers sleep until their slot. Thread-safe.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, key: Hashable = None):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(key, now))
+            self._next[key] = slot + self.interval
+            # Forget idle chats so the table doesn't grow with every subscriber ever seen
+            if len(self._next) > 10000:
+                self._next = {k: t for k, t in self._next.items() if t > now}
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TelegramClient:
+    """
+    Pooled Bot API client.
+    api_url: https://api.telegram.org/bot<token> (or a local mock server)
+    workers: concurrent chats during fan_out (also the connection pool size)
+    rate_per_second: global send limit (Bot API allows ~30 messages/s)
+    chat_interval: minimum spacing between sends to one chat (~1 message/s)
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_url: str, workers: int = 8, rate_per_second: float = 25.0,
+                 chat_interval: float = 1.0, max_retries: int = 4, backoff: float = 0.5,
+                 timeout: float = 10.0):
+        self.api_url = api_url.rstrip('/')
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers + 2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._global_limit = RateLimiter(1.0 / rate_per_second if rate_per_second > 0 else 0)
+        self._chat_limit = RateLimiter(chat_interval)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="telegram")
+        # Multi-step jobs (upload, then fan out) run here so they never wait on their own pool
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="telegram-bg")
+
+        # Counters for /pipeline_stats
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.uploads = 0
+        self.bytes_uploaded = 0
+
+    def call(self, method: str, params: Optional[Dict[str, Any]] = None,
+             files: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+             retries: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        POST a Bot API method. Returns the decoded JSON response (which may
+        have ok=False for non-retryable errors), or None if every attempt failed.
+        Calls carrying a chat_id are rate limited.
+        """
+        params = dict(params or {})
+        chat_id = params.get('chat_id')
+        if files:
+            # Multipart form fields must be strings; nested objects go as JSON
+            params = {k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in params.items()}
+        retries = self.max_retries if retries is None else retries
+        url = f"{self.api_url}/{method}"
+
+        for attempt in range(retries + 1):
+            if chat_id is not None:
+                self._chat_limit.wait(chat_id)
+                self._global_limit.wait()
+            self.calls += 1
+            delay = self.backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+            if files:
+                self.uploads += 1
+                self.bytes_uploaded += sum(len(f[1]) for f in files.values() if isinstance(f, tuple))
+            try:
+                if files:
+                    response = self.session.post(url, data=params, files=files, timeout=timeout or self.timeout)
+                else:
+                    response = self.session.post(url, json=params, timeout=timeout or self.timeout)
+                data = response.json()
+            except (requests.RequestException, ValueError) as e:
+                print(f"[BOT API ERROR] {method}: {e}")
+                data, status = None, None
+            else:
+                status = response.status_code
+                if data.get('ok') or status not in self.RETRY_STATUS:
+                    return data
+                # Flood control: Telegram says exactly how long to wait
+                retry_after = (data.get('parameters') or {}).get('retry_after')
+                if retry_after:
+                    delay = float(retry_after)
+                print(f"[BOT API ERROR] {method}: HTTP {status} {data.get('description', '')}")
+
+            if attempt < retries:
+                self.retries += 1
+                time.sleep(delay)
+
+        self.failures += 1
+        return data
+
+    def fan_out(self, chat_ids: Iterable[Hashable], job: Callable[[Hashable], Any]) -> Dict[Hashable, Any]:
+        """
+        Run job(chat_id) for every chat on the worker pool and wait for all.
+        Each job runs its own calls sequentially, so per-chat order is kept
+        (e.g. photo then location). Returns {chat_id: result or exception}.
+        """
+        futures = {chat_id: self._pool.submit(job, chat_id) for chat_id in chat_ids}
+        results = {}
+        for chat_id, future in futures.items():
+            try:
+                results[chat_id] = future.result()
+            except Exception as e:
+                results[chat_id] = e
+        return results
+
+    def submit(self, job: Callable[..., Any], *args) -> Future:
+        """
+        Run job(*args) in the background and return at once, e.g. so a clip
+        writer never waits on uploads, retries or 429 back-off. The job may
+        use fan_out(). Exceptions are logged.
+        """
+        def run():
+            try:
+                return job(*args)
+            except Exception as e:
+                print(f"[BOT API ERROR] Background job {getattr(job, '__name__', job)} failed: {e}")
+        return self._background.submit(run)
+
+    def stats(self) -> Dict[str, int]:
+        """API calls, retries, calls that gave up and media uploads."""
+        return {
+            'workers': self.workers,
+            'calls': self.calls,
+            'retries': self.retries,
+            'failures': self.failures,
+            'uploads': self.uploads,
+            'bytes_uploaded': self.bytes_uploaded
+        }
+
+    def close(self):
+        self._background.shutdown(wait=False)
+        self._pool.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,238 @@
+"""
+CityWatch - Hot-Path Telemetry
+Fixed-bucket latency histograms, counters and fps meters for the video
+pipeline, rendered as Prometheus text for /metrics.
+Recording is a bisect plus a counter bump, cheap enough for every frame.
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# (labels, value) samples of one metric family
+Samples = List[Tuple[Dict[str, Any], float]]
+# (name, type, help, samples) as returned by a collector
+Family = Tuple[str, str, str, Samples]
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram in milliseconds.
+    Percentiles are estimated by linear interpolation inside the bucket.
+    """
+
+    DEFAULT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.bounds = tuple(sorted(buckets_ms))
+        self.counts = [0] * (len(self.bounds) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float):
+        index = bisect.bisect_left(self.bounds, value_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value_ms
+            if value_ms > self.max:
+                self.max = value_ms
+
+    def quantile(self, q: float) -> float:
+        """Estimated q-quantile (0..1) in ms; 0.0 if nothing was observed."""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+            largest = self.max
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = min(self.bounds[index], largest) if index < len(self.bounds) else largest
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return largest
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean, max and p50/p95/p99 for JSON stats."""
+        with self._lock:
+            count, total, largest = self.count, self.sum, self.max
+        return {
+            'count': count,
+            'mean_ms': round(total / count, 3) if count else 0.0,
+            'p50_ms': round(self.quantile(0.50), 3),
+            'p95_ms': round(self.quantile(0.95), 3),
+            'p99_ms': round(self.quantile(0.99), 3),
+            'max_ms': round(largest, 3)
+        }
+
+    def cumulative(self) -> Tuple[List[Tuple[float, int]], int, float]:
+        """([(upper bound ms, cumulative count), ...], count, sum) for exposition."""
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+        buckets, running = [], 0
+        for bound, bucket_count in zip(self.bounds + (float('inf'),), counts):
+            running += bucket_count
+            buckets.append((bound, running))
+        return buckets, count, total
+
+
+class RateMeter:
+    """Events per second over a sliding time window (e.g. live fps)."""
+
+    def __init__(self, window: float = 5.0, max_events: int = 2048):
+        self.window = window
+        self._events = deque(maxlen=max_events)
+        self.total = 0
+
+    def tick(self, count: int = 1):
+        self._events.append((time.monotonic(), count))
+        self.total += count
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        events = [(t, n) for t, n in list(self._events) if now - t <= self.window]
+        if not events:
+            return 0.0
+        span = max(now - events[0][0], 1e-3)
+        return sum(n for _, n in events) / span if len(events) > 1 else events[0][1] / self.window
+
+
+class Telemetry:
+    """
+    Registry for the pipeline's stage histograms, counters and fps meters.
+    Stages: capture, inference, postprocess, draw, encode, alert, end_to_end.
+    Other components (queues, engine, broadcaster) are read at scrape time
+    through collectors instead of being copied into the registry.
+    """
+
+    STAGES = ('capture', 'inference', 'postprocess', 'draw', 'encode', 'alert', 'end_to_end')
+    PREFIX = 'citywatch'
+
+    def __init__(self, buckets_ms: Sequence[float] = Histogram.DEFAULT_BUCKETS_MS,
+                 fps_window: float = 5.0):
+        self._buckets_ms = buckets_ms
+        self._fps_window = fps_window
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Histogram] = {stage: Histogram(buckets_ms) for stage in self.STAGES}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], float] = {}
+        self.meters: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], RateMeter] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, Any], ...]]:
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, stage: str, ms: float):
+        """Record one latency sample (ms) for a pipeline stage."""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram(self._buckets_ms))
+        histogram.observe(ms)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Increase a monotonic counter, e.g. inc('alerts_sent', type='WEAPON')."""
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def tick(self, name: str, count: int = 1, **labels):
+        """Count frames for an fps meter, e.g. tick('capture', camera=0)."""
+        key = self._key(name, labels)
+        meter = self.meters.get(key)
+        if meter is None:
+            with self._lock:
+                meter = self.meters.setdefault(key, RateMeter(self._fps_window))
+        meter.tick(count)
+
+    def fps(self, name: str, **labels) -> float:
+        meter = self.meters.get(self._key(name, labels))
+        return meter.rate() if meter else 0.0
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Register a callable returning (name, type, help, samples) families at scrape time."""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON view: per-stage summaries, fps and counters."""
+        with self._lock:
+            counters = dict(self.counters)
+            meters = dict(self.meters)
+            histograms = dict(self.histograms)
+        return {
+            'stages': {stage: h.summary() for stage, h in histograms.items()},
+            'fps': {_label_str(name, labels): round(meter.rate(), 2) for (name, labels), meter in meters.items()},
+            'counters': {_label_str(name, labels): value for (name, labels), value in counters.items()}
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        metric = f"{self.PREFIX}_stage_latency_seconds"
+        lines.append(f"# HELP {metric} Processing latency per pipeline stage.")
+        lines.append(f"# TYPE {metric} histogram")
+        with self._lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+            meters = dict(self.meters)
+        for stage, histogram in histograms.items():
+            buckets, count, total = histogram.cumulative()
+            for bound, cumulative in buckets:
+                le = '+Inf' if bound == float('inf') else _format_value(bound / 1000)
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {_format_value(total / 1000)}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {count}')
+
+        families: Dict[str, Family] = {}
+        for (name, labels), value in counters.items():
+            family = families.setdefault(name, (f"{name}_total", 'counter', f"Total {name.replace('_', ' ')}.", []))
+            family[3].append((dict(labels), value))
+        for (name, labels), meter in meters.items():
+            family = families.setdefault(f"{name}:fps", (f"{name}_fps", 'gauge',
+                                                         f"Live {name.replace('_', ' ')} rate (frames/s).", []))
+            family[3].append((dict(labels), round(meter.rate(), 3)))
+        for name, kind, help_text, samples in families.values():
+            _render_family(lines, f"{self.PREFIX}_{name}", kind, help_text, samples)
+
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                _render_family(lines, f"{self.PREFIX}_{name}", kind, help_text, samples)
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _label_str(name: str, labels: Tuple[Tuple[str, Any], ...]) -> str:
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}={value}' for key, value in labels) + '}'
+
+
+def _render_family(lines: List[str], name: str, kind: str, help_text: str, samples: Samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        if labels:
+            rendered = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+            lines.append(f"{name}{{{rendered}}} {_format_value(value)}")
+        else:
+            lines.append(f"{name} {_format_value(value)}")
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,50 @@
+"""
+CityWatch - Event store tests
+Run from Backend/: python -m pytest -q
+"""
+
+import sqlite3
+
+import pytest
+
+from event_store import EventStore
+
+
+class FailOnceConnection:
+    """Real connection whose first batch insert fails, like a transient disk error."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        self.failed = False
+
+    @property
+    def in_transaction(self) -> bool:
+        return self.db.in_transaction
+
+    def execute(self, *args):
+        return self.db.execute(*args)
+
+    def executemany(self, *args):
+        if not self.failed:
+            self.failed = True
+            raise sqlite3.OperationalError("disk I/O error")
+        return self.db.executemany(*args)
+
+
+def test_failed_flush_rolls_back_and_next_flush_persists(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"))
+    db = FailOnceConnection(store._connect())
+    store.record(0, "WEAPON DETECTED", ts=100.0)
+    store.record(1, "SOS SIGNAL", ts=101.0)
+
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush(db)
+    assert not db.in_transaction
+    assert store.stats()['buffered'] == 2  # Rows kept for the next flush
+
+    store.record(2, "PERSON DOWN", ts=102.0)
+    assert store.flush(db) == 3
+    events = store.query(limit=10)['events']
+    assert [e['ts'] for e in events] == [102.0, 101.0, 100.0]
+    assert store.stats()['write_failures'] == 1
+    db.db.close()
@@ -0,0 +1,106 @@
+"""
+CityWatch - Engine tests
+Run from Backend/: python -m pytest -q
+The detector is replaced by a scripted one, so no model or GPU is needed.
+"""
+
+import numpy as np
+import pytest
+
+import logic_core
+from logic_core import CityWatchEngine
+
+# A person lying low in a 640x480 frame: horizontal for the fall test and wide for the SOS test
+LYING_PERSON = np.array([[100, 380, 400, 470, 0.9, CityWatchEngine.PERSON_CLASS]], dtype=np.float32)
+
+
+class ScriptedDetector:
+    """Returns the same boxes for every image and counts detector calls."""
+    name = "scripted"
+    device = "cpu"
+    precision = "fp32"
+
+    def __init__(self, boxes: np.ndarray):
+        self.boxes = boxes
+        self.calls = 0
+
+    def detect(self, frames, conf_threshold, classes=None, imgsz=None):
+        self.calls += 1
+        return [self.boxes.copy() for _ in frames]
+
+    def stats(self):
+        return {'backend': self.name, 'calls': self.calls}
+
+
+@pytest.fixture
+def make_engine(monkeypatch):
+    def build(boxes=LYING_PERSON, **kwargs):
+        detector = ScriptedDetector(boxes)
+        monkeypatch.setattr(logic_core, 'create_detector', lambda *args, **kw: detector)
+        return CityWatchEngine(**kwargs), detector
+    return build
+
+
+def run(engine, frames):
+    return [engine.detect_batch([frame])[0] for frame in frames]
+
+
+def test_skipped_frames_do_not_confirm_fall_or_sos(make_engine):
+    # Detector runs on the first frame only; later frames carry its boxes over
+    engine, detector = make_engine(motion_gate=True)
+    engine._should_detect = lambda cam, frame: cam.last_detections is None
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    outputs = run(engine, [frame] * (engine.FALL_CONFIRM_FRAMES + 2))
+
+    assert detector.calls == 1
+    assert [annotated.result.detector_ran for annotated, _ in outputs] == [True] + [False] * (len(outputs) - 1)
+    assert not any(status['fall_detected'] or status['sos_detected'] for _, status in outputs)
+    tracker = engine.get_camera_state(0).tracker
+    assert tracker.fall_hits.tolist() == [1]
+    assert tracker.sos_count.tolist() == [1]
+    engine.release()
+
+
+def test_static_fall_confirms_despite_motion_gate(make_engine):
+    # A fallen person lies still: the pending streak keeps the detector running
+    engine, detector = make_engine(motion_gate=True)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    outputs = run(engine, [frame] * engine.FALL_CONFIRM_FRAMES)
+
+    assert detector.calls == engine.FALL_CONFIRM_FRAMES
+    assert outputs[-1][1]['fall_detected']
+    engine.release()
+
+
+def test_fall_confirms_after_consecutive_detector_frames(make_engine):
+    engine, detector = make_engine(motion_gate=False, idle_detect_interval=1)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    outputs = run(engine, [frame] * engine.FALL_CONFIRM_FRAMES)
+
+    assert detector.calls == engine.FALL_CONFIRM_FRAMES
+    assert [status['fall_detected'] for _, status in outputs] == [False] * (engine.FALL_CONFIRM_FRAMES - 1) + [True]
+    engine.release()
+
+
+def test_person_in_view_detects_every_frame_without_motion(make_engine):
+    standing = np.array([[100, 100, 160, 300, 0.9, CityWatchEngine.PERSON_CLASS]], dtype=np.float32)
+    engine, detector = make_engine(boxes=standing, motion_gate=True, idle_detect_interval=3)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    run(engine, [frame] * 10)
+
+    assert detector.calls == 10
+    assert engine.motion_skips == 0
+    stats = engine.get_statistics()
+    assert stats['detect_mode'] == {'0': 'active'}
+    assert stats['active_hold_frames'] == engine.active_hold_frames
+    engine.release()
+
+
+def test_empty_static_scene_is_motion_gated(make_engine):
+    engine, detector = make_engine(boxes=np.zeros((0, 6), dtype=np.float32), motion_gate=True)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    run(engine, [frame] * 10)
+
+    assert detector.calls == 1
+    assert engine.get_statistics()['detect_mode'] == {'0': 'idle'}
+    engine.release()
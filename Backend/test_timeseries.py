@@ -0,0 +1,35 @@
+"""
+CityWatch - Threat time series tests
+Run from Backend/: python -m pytest -q
+"""
+
+import numpy as np
+
+from timeseries import ThreatTimeSeries
+
+
+def test_minute_rollup_includes_samples_still_in_open_buckets():
+    series = ThreatTimeSeries()
+    # First seconds after startup: nothing has closed into the 1m ring yet
+    for t, value in ((0.2, 10), (0.7, 30), (1.5, 50), (2.1, 90)):
+        series.append(t, value)
+
+    minute = series.query(0, 60, '1m')
+    assert minute['t'].tolist() == [0]
+    assert minute['min'].tolist() == [10]
+    assert minute['max'].tolist() == [90]
+    assert np.isclose(minute['mean'][0], 45)
+
+    hour = series.query(0, 3600, '1h')
+    assert hour['t'].tolist() == [0] and hour['max'].tolist() == [90]
+
+
+def test_open_buckets_across_a_minute_boundary():
+    series = ThreatTimeSeries()
+    series.append(59.5, 20)
+    series.append(60.2, 80)  # Closes the 1s bucket at 59, but the minute at 0 stays open
+
+    minute = series.query(0, 120, '1m')
+    assert minute['t'].tolist() == [0, 60]
+    assert minute['max'].tolist() == [20, 80]
+    assert series.query(60, 120, '1m')['t'].tolist() == [60]
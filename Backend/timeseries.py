@@ -0,0 +1,190 @@
+"""
+CityWatch - Threat Level Time Series
+Fixed-size NumPy ring buffers for the per-frame threat level, with
+min/max/mean rollups at 1 s, 1 min and 1 h. Memory is constant and a
+query only touches (and copies) the requested window.
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity ring of float64 columns kept in time order.
+    Rows are appended in increasing time; the oldest row is overwritten.
+    """
+
+    def __init__(self, capacity: int, columns: Tuple[str, ...]):
+        self.capacity = capacity
+        self.columns = columns
+        self.data = np.zeros((len(columns), capacity), dtype=np.float64)
+        self.head = 0   # Next write position
+        self.size = 0
+
+    def append(self, *values: float):
+        self.data[:, self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _segments(self) -> List[Tuple[int, int]]:
+        """Physical [start, stop) ranges holding rows, oldest first."""
+        start = (self.head - self.size) % self.capacity
+        if start + self.size <= self.capacity:
+            return [(start, start + self.size)]
+        return [(start, self.capacity), (0, self.head)]
+
+    def window(self, start: Optional[float], end: Optional[float]) -> np.ndarray:
+        """Copy of the rows with start <= t < end (column 0 is time), oldest first."""
+        parts = []
+        for lo, hi in self._segments():
+            times = self.data[0, lo:hi]
+            i = lo + (np.searchsorted(times, start, 'left') if start is not None else 0)
+            j = lo + (np.searchsorted(times, end, 'left') if end is not None else hi - lo)
+            if j > i:
+                parts.append(self.data[:, i:j])
+        if not parts:
+            return np.zeros((len(self.columns), 0))
+        return parts[0].copy() if len(parts) == 1 else np.concatenate(parts, axis=1)
+
+    def last(self, n: int) -> np.ndarray:
+        """Copy of the newest n rows, oldest first."""
+        n = min(n, self.size)
+        idx = (self.head - n + np.arange(n)) % self.capacity
+        return self.data[:, idx]
+
+
+class _Bucket:
+    """Open rollup bucket being filled."""
+    __slots__ = ('start', 'min', 'max', 'sum', 'count')
+
+    def __init__(self, start: float):
+        self.start = start
+        self.min = np.inf
+        self.max = -np.inf
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, vmin: float, vmax: float, vsum: float, count: int):
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+        self.sum += vsum
+        self.count += count
+
+
+class ThreatTimeSeries:
+    """
+    Raw per-frame samples plus 1 s / 1 min / 1 h rollups. Each closed 1 s
+    bucket feeds the minute rollup, each minute the hour, so appends are O(1).
+    Default retention: 10 min raw, 1 day at 1 s, 30 days at 1 min, 1 year at 1 h.
+    """
+
+    ROLLUPS = (('1s', 1), ('1m', 60), ('1h', 3600))
+    ROLLUP_COLUMNS = ('t', 'min', 'max', 'sum', 'count')
+
+    def __init__(self, raw_capacity: int = 18000, capacities: Optional[Dict[str, int]] = None):
+        capacities = {'1s': 86400, '1m': 43200, '1h': 8760, **(capacities or {})}
+        self.raw = RingBuffer(raw_capacity, ('t', 'value'))
+        self.rollups = {name: RingBuffer(capacities[name], self.ROLLUP_COLUMNS) for name, _ in self.ROLLUPS}
+        self._open: Dict[str, Optional[_Bucket]] = {name: None for name, _ in self.ROLLUPS}
+        self._lock = threading.Lock()
+        self.latest = 0.0
+        self.last_time = -np.inf
+
+    def append(self, timestamp: float, value: float):
+        """Record one sample (e.g. the threat level of a processed frame)."""
+        with self._lock:
+            # Keep rings sorted even if a caller's clock steps back slightly
+            timestamp = self.last_time = max(timestamp, self.last_time)
+            self.raw.append(timestamp, value)
+            self.latest = value
+            self._feed(0, timestamp, value, value, value, 1)
+
+    def _feed(self, level: int, timestamp: float, vmin: float, vmax: float, vsum: float, count: int):
+        """Add to the open bucket at `level`, closing it (and cascading up) when time moves on."""
+        name, seconds = self.ROLLUPS[level]
+        start = timestamp - timestamp % seconds
+        bucket = self._open[name]
+        if bucket is not None and bucket.start != start:
+            self.rollups[name].append(bucket.start, bucket.min, bucket.max, bucket.sum, bucket.count)
+            if level + 1 < len(self.ROLLUPS):
+                self._feed(level + 1, bucket.start, bucket.min, bucket.max, bucket.sum, bucket.count)
+            bucket = None
+        if bucket is None:
+            bucket = self._open[name] = _Bucket(start)
+        bucket.add(vmin, vmax, vsum, count)
+
+    def _pending_rows(self, level: int) -> np.ndarray:
+        """
+        Rows at `level` that its ring doesn't hold yet: its open bucket plus the
+        open buckets below it, whose samples only cascade up when they close.
+        Lets a query reach the newest sample at any resolution.
+        """
+        seconds = self.ROLLUPS[level][1]
+        rows: Dict[float, List[float]] = {}
+        for name, _ in self.ROLLUPS[:level + 1]:
+            bucket = self._open[name]
+            if bucket is None or not bucket.count:
+                continue
+            start = bucket.start - bucket.start % seconds
+            row = rows.get(start)
+            if row is None:
+                rows[start] = [bucket.min, bucket.max, bucket.sum, bucket.count]
+            else:
+                row[0], row[1] = min(row[0], bucket.min), max(row[1], bucket.max)
+                row[2] += bucket.sum
+                row[3] += bucket.count
+        if not rows:
+            return np.zeros((len(self.ROLLUP_COLUMNS), 0))
+        return np.array([[start, *rows[start]] for start in sorted(rows)]).T
+
+    def pick_resolution(self, start: Optional[float], end: Optional[float], max_points: int) -> str:
+        """Finest resolution whose point count for the window fits in max_points."""
+        if start is None or end is None:
+            return '1s'
+        span = max(end - start, 0)
+        for name, seconds in self.ROLLUPS:
+            if span / seconds <= max_points:
+                return name
+        return self.ROLLUPS[-1][0]
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              resolution: str = '1s') -> Dict[str, Any]:
+        """
+        Samples in [start, end) at 'raw', '1s', '1m' or '1h'.
+        Rollups return bucket start times with min/max/mean (buckets still
+        filling are included, up to the newest sample); raw returns t/value.
+        """
+        with self._lock:
+            if resolution == 'raw':
+                t, value = self.raw.window(start, end)
+                return {'resolution': 'raw', 't': t, 'value': value}
+            if resolution not in self.rollups:
+                raise ValueError(f"Unknown resolution: {resolution}")
+            rows = self.rollups[resolution].window(start, end)
+            level = [name for name, _ in self.ROLLUPS].index(resolution)
+            pending = self._pending_rows(level)
+            keep = np.ones(pending.shape[1], dtype=bool)
+            if start is not None:
+                keep &= pending[0] >= start
+            if end is not None:
+                keep &= pending[0] < end
+            rows = np.concatenate([rows, pending[:, keep]], axis=1)
+
+        t, vmin, vmax, vsum, count = rows
+        return {'resolution': resolution, 't': t, 'min': vmin, 'max': vmax,
+                'mean': np.divide(vsum, count, out=np.zeros_like(vsum), where=count > 0)}
+
+    def last(self, n: int) -> np.ndarray:
+        """Newest n raw values, oldest first."""
+        with self._lock:
+            return self.raw.last(n)[1]
+
+    def stats(self) -> Dict[str, int]:
+        """Stored points per resolution."""
+        with self._lock:
+            stats = {'raw': self.raw.size}
+            stats.update({name: ring.size for name, ring in self.rollups.items()})
+        return stats
@@ -73,7 +73,7 @@ function App() {
   // Refs
   const videoRef = useRef(null);
   const lastAlertRef = useRef(0);
-  const fetchIntervalRef = useRef(null);
+  const liveStatsRef = useRef({});
 
   // Hooks
   const sound = useSound();
@@ -149,56 +149,49 @@ function App() {
 
   useKeyboard(shortcuts);
 
-  // Fetch stats - optimized with error handling
+  // Live stats - pushed by the server (SSE) only when something changes
   useEffect(() => {
-    const fetchStats = async () => {
-      try {
-        const res = await axios.get(`${API_URL}/stats`, { timeout: 3000 });
-        const data = res.data;
-
-        if (data.status === 'initializing') {
-          return; // Engine still starting
-        }
-
-        setStats(prev => ({
-          ...prev,
-          ...data,
-        }));
-        setApiError(false);
-
-        // Sync grid mode from server
-        if (data.grid_mode !== undefined) {
-          setGridMode(data.grid_mode);
-        }
-
-        // Check for threats (with cooldown)
-        const now = Date.now();
-        if (data.weapon_detected && now - lastAlertRef.current > 10000) {
-          lastAlertRef.current = now;
-          setActiveAlert({ type: 'weapon', message: 'AI detected potential weapon in frame' });
-          if (!muted) sound.playAlert();
-          addNotification('WEAPON DETECTED', 'critical');
-        }
-        if (data.fall_detected && now - lastAlertRef.current > 10000) {
-          lastAlertRef.current = now;
-          setActiveAlert({ type: 'fall', message: 'Person down detected' });
-          if (!muted) sound.playAlert();
-          addNotification('PERSON DOWN', 'critical');
-        }
-      } catch (e) {
-        setApiError(true);
-        console.error('Stats fetch failed:', e.message);
+    const source = new EventSource(`${API_URL}/stats/stream?max_rate=5`);
+
+    source.onmessage = (event) => {
+      // Each event is a delta: merge it into the last known stats
+      const data = { ...liveStatsRef.current, ...JSON.parse(event.data) };
+      liveStatsRef.current = data;
+
+      setStats(prev => ({
+        ...prev,
+        ...data,
+      }));
+      setApiError(false);
+
+      // Sync grid mode from server
+      if (data.grid_mode !== undefined) {
+        setGridMode(data.grid_mode);
       }
-    };
-
-    fetchStats(); // Initial fetch
-    fetchIntervalRef.current = setInterval(fetchStats, 200); // Increased frequency for immediate alerts
 
-    return () => {
-      if (fetchIntervalRef.current) {
-        clearInterval(fetchIntervalRef.current);
+      // Check for threats (with cooldown)
+      const now = Date.now();
+      if (data.weapon_detected && now - lastAlertRef.current > 10000) {
+        lastAlertRef.current = now;
+        setActiveAlert({ type: 'weapon', message: 'AI detected potential weapon in frame' });
+        if (!muted) sound.playAlert();
+        addNotification('WEAPON DETECTED', 'critical');
+      }
+      if (data.fall_detected && now - lastAlertRef.current > 10000) {
+        lastAlertRef.current = now;
+        setActiveAlert({ type: 'fall', message: 'Person down detected' });
+        if (!muted) sound.playAlert();
+        addNotification('PERSON DOWN', 'critical');
       }
     };
+
+    // EventSource reconnects on its own; a fresh connection resends the full snapshot
+    source.onerror = () => {
+      setApiError(true);
+      liveStatsRef.current = {};
+    };
+
+    return () => source.close();
   }, [muted, sound, addNotification]);
 
   // Clock - update every second